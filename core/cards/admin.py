@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from cards.models import Deck, Card, CardProgress, CardAdditionalImage, LearningLog
+from cards.models import (
+    Deck, Card, CardProgress, CardAdditionalImage, LearningLog, LearningDeck,
+    LearningDay
+)
 
 
 class DeckAdmin(admin.ModelAdmin):
@@ -15,7 +18,7 @@ class CardAdmin(admin.ModelAdmin):
     list_filter = ('deck',)
     search_fields = ('word', 'translation',)
     readonly_fields = ('image_hash',)
-    exclude = ('hashed_image',)
+    exclude = ('hashed_image', 'distractors')
 
 
 class CardAddtionalImageAdmin(admin.ModelAdmin):
@@ -33,8 +36,21 @@ class LearningLogAdmin(admin.ModelAdmin):
     search_fields = ('user', 'card')
 
 
+class LearningDeckAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'deck', 'date')
+    search_fields = ('user__username',)
+
+
+class LearningDayAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'date', 'count')
+    list_filter = ('date',)
+    search_fields = ('user__username',)
+
+
 admin.site.register(Deck, DeckAdmin)
 admin.site.register(Card, CardAdmin)
 admin.site.register(CardAdditionalImage, CardAddtionalImageAdmin)
 admin.site.register(CardProgress, CardProgressAdmin)
 admin.site.register(LearningLog, LearningLogAdmin)
+admin.site.register(LearningDeck, LearningDeckAdmin)
+admin.site.register(LearningDay, LearningDayAdmin)
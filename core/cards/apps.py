@@ -7,4 +7,6 @@ class CardsConfig(AppConfig):
 
     def ready(self):
         from .signals import set_card_images,\
-            set_deck_images, set_card_additional_images
+            set_deck_images, set_card_additional_images, update_answer_pool,\
+            update_card_distractors, remove_card_distractors,\
+            drop_deck_distractors
@@ -0,0 +1,185 @@
+import random
+import time
+
+from django.core.cache import cache
+
+from cards.models import Card
+
+ANSWER_POOL_TIMEOUT = 60 * 60 * 24
+
+
+def _answer_pool_version_key(deck_id):
+    return f'cards:answer_pool_version:{deck_id}'
+
+
+def _answer_pool_version(deck_id):
+    key = _answer_pool_version_key(deck_id)
+    # A version that was evicted must not restart from an old value
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def get_answer_pool(deck_id):
+    """
+    Distinct translations of the deck's cards, read from the cache
+    """
+    key = f'cards:answer_pool:{deck_id}'
+    version = _answer_pool_version(deck_id)
+    pool = cache.get(key, version=version)
+
+    if pool is None:
+        pool = list(
+            Card.objects.filter(deck_id=deck_id)
+            .values_list('translation', flat=True)
+            .distinct()
+        )
+        cache.set(key, pool, ANSWER_POOL_TIMEOUT, version=version)
+    return pool
+
+
+def invalidate_answer_pool(deck_id):
+    try:
+        cache.incr(_answer_pool_version_key(deck_id))
+    except ValueError:
+        _answer_pool_version(deck_id)
+
+
+CARD_IDS_TIMEOUT = 60 * 60
+CARD_IDS_CHUNK_SIZE = 1000
+
+
+def _card_ids_scope(deck_id, has_image):
+    return f'{deck_id or "all"}:{int(has_image)}'
+
+
+def _card_ids_version_key(scope):
+    return f'cards:card_ids_version:{scope}'
+
+
+def _card_ids_version(scope):
+    key = _card_ids_version_key(scope)
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def _card_ids_key(scope, part):
+    return f'cards:card_ids:{scope}:{part}'
+
+
+def _cache_card_ids(scope, version, deck_id, has_image):
+    cards = Card.objects.all()
+    if deck_id:
+        cards = cards.filter(deck_id=deck_id)
+    if has_image:
+        cards = cards.exclude(image__isnull=True).exclude(image='')
+    card_ids = list(cards.order_by('id').values_list('id', flat=True))
+
+    # Chunks by id range, so a pick reads one of them and a changed
+    # card rewrites only its own
+    chunks = {}
+    for card_id in card_ids:
+        chunks.setdefault(card_id // CARD_IDS_CHUNK_SIZE, []).append(card_id)
+    values = {
+        _card_ids_key(scope, number): chunk
+        for number, chunk in chunks.items()
+    }
+    values[_card_ids_key(scope, 'sizes')] = {
+        number: len(chunk) for number, chunk in chunks.items()
+    }
+    cache.set_many(values, CARD_IDS_TIMEOUT, version=version)
+    return card_ids
+
+
+def random_card_id(deck_id=None, has_image=False):
+    """
+    Id of a random card matching the filters, None if there is none.
+    The ids are cached in chunks with their sizes, a pick reads the
+    sizes and one chunk. Added, moved and deleted cards update the
+    chunk they fall in, see update_card_id, the ids are reloaded at
+    least hourly.
+    """
+    scope = _card_ids_scope(deck_id, has_image)
+    version = _card_ids_version(scope)
+    sizes = cache.get(_card_ids_key(scope, 'sizes'), version=version)
+    if sizes == {}:
+        return None
+    if sizes is not None:
+        number, = random.choices(list(sizes), weights=list(sizes.values()))
+        chunk = cache.get(_card_ids_key(scope, number), version=version)
+        if chunk:
+            return random.choice(chunk)
+
+    # Not cached yet or a chunk was evicted
+    card_ids = _cache_card_ids(scope, version, deck_id, has_image)
+    return random.choice(card_ids) if card_ids else None
+
+
+def _card_id_scopes(state):
+    if state is None:
+        return set()
+    deck_id, has_image = state
+    return {
+        _card_ids_scope(scope_deck_id, image)
+        for scope_deck_id in (None, deck_id)
+        for image in (False, True) if image <= has_image
+    }
+
+
+def update_card_id(card_id, old=None, new=None):
+    """
+    Move card_id in the cached ids from the old to the new
+    (deck_id, has_image) state, None for a card that does not exist.
+    Only the chunk of the card and the sizes of each affected scope are
+    rewritten, scopes that are not cached are left alone. An update
+    lost to a concurrent one is caught by the stale read fallback of
+    RandomCardView or the hourly reload.
+    """
+    old_scopes, new_scopes = _card_id_scopes(old), _card_id_scopes(new)
+    number = card_id // CARD_IDS_CHUNK_SIZE
+    for scope in old_scopes ^ new_scopes:
+        version = cache.get(_card_ids_version_key(scope))
+        if version is None:
+            continue
+        sizes_key = _card_ids_key(scope, 'sizes')
+        chunk_key = _card_ids_key(scope, number)
+        cached = cache.get_many([sizes_key, chunk_key], version=version)
+        sizes = cached.get(sizes_key)
+        if sizes is None:
+            continue
+        chunk = cached.get(chunk_key, [])
+        if len(chunk) != sizes.get(number, 0):
+            # The chunk was evicted, the scope is reloaded
+            _invalidate_card_ids_scope(scope)
+            continue
+
+        if scope in new_scopes:
+            chunk = sorted({*chunk, card_id})
+        else:
+            chunk = [value for value in chunk if value != card_id]
+        if chunk:
+            sizes[number] = len(chunk)
+        else:
+            sizes.pop(number, None)
+        cache.set_many(
+            {sizes_key: sizes, chunk_key: chunk},
+            CARD_IDS_TIMEOUT,
+            version=version
+        )
+
+
+def _invalidate_card_ids_scope(scope):
+    try:
+        cache.incr(_card_ids_version_key(scope))
+    except ValueError:
+        _card_ids_version(scope)
+
+
+def invalidate_card_ids(deck_ids=(), has_image=True):
+    """
+    Reload the cached ids of all cards and of the decks, the ids of
+    cards with an image only when has_image. Used when a read finds
+    the cached ids stale.
+    """
+    for deck_id in (None, *deck_ids):
+        for image in (False, True) if has_image else (False,):
+            _invalidate_card_ids_scope(_card_ids_scope(deck_id, image))
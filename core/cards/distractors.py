@@ -0,0 +1,162 @@
+import heapq
+from collections import Counter, defaultdict
+from itertools import islice
+
+from cards.models import Card
+
+# How many confusable translations are stored for every card
+INDEX_SIZE = 6
+
+PREFIX_WEIGHT = 0.5
+MAX_PREFIX = 3
+LENGTH_WEIGHT = 0.5
+
+
+def _common_prefix(a, b):
+    size = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        size += 1
+    return size
+
+
+def _edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        left = i
+        for j, y in enumerate(b, 1):
+            left = min(previous[j] + 1, left + 1, previous[j - 1] + (x != y))
+            current.append(left)
+        previous = current
+    return previous[-1]
+
+
+def confusability(a, b):
+    """
+    How easy it is to mistake a for b, higher is more similar
+    """
+    a, b = a.lower(), b.lower()
+    return (
+        PREFIX_WEIGHT * min(_common_prefix(a, b), MAX_PREFIX)
+        - LENGTH_WEIGHT * abs(len(a) - len(b))
+        - _edit_distance(a, b)
+    )
+
+
+def _bigrams(text):
+    text = f' {text.lower()} '
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class DistractorIndex:
+    """
+    Finds the most confusable translations of a deck.
+    Candidates sharing the most bigrams are shortlisted through an
+    inverted index first, only the shortlist is scored exactly.
+    """
+    SHORTLIST_SIZE = 24
+
+    def __init__(self, translations):
+        self.translations = sorted(set(translations))
+        self.postings = defaultdict(list)
+        for position, translation in enumerate(self.translations):
+            for bigram in _bigrams(translation):
+                self.postings[bigram].append(position)
+
+    def _shortlist(self, translation):
+        shared = Counter()
+        for bigram in _bigrams(translation):
+            shared.update(self.postings.get(bigram, ()))
+        positions = heapq.nlargest(
+            self.SHORTLIST_SIZE,
+            shared,
+            key=lambda position: (
+                shared[position],
+                -abs(len(self.translations[position]) - len(translation))
+            )
+        )
+        if len(positions) < self.SHORTLIST_SIZE:
+            # Not enough translations in common, top up with any others
+            rest = (
+                position for position in range(len(self.translations))
+                if position not in shared
+            )
+            positions += islice(rest, self.SHORTLIST_SIZE - len(positions))
+        return [self.translations[position] for position in positions]
+
+    def find(self, translation, size=INDEX_SIZE):
+        scored = [
+            (confusability(translation, candidate), candidate)
+            for candidate in self._shortlist(translation)
+            if candidate != translation
+        ]
+        return [candidate for _, candidate in heapq.nlargest(size, scored)]
+
+
+def build_deck_index(deck_id):
+    """
+    Recompute distractors for every card of the deck
+    """
+    cards = list(
+        Card.objects.filter(deck_id=deck_id).only('id', 'translation')
+    )
+    index = DistractorIndex(card.translation for card in cards)
+
+    for card in cards:
+        card.distractors = index.find(card.translation)
+    Card.objects.bulk_update(cards, ['distractors'], batch_size=500)
+    return len(cards)
+
+
+def update_deck_index(deck_id, card_ids=(), removed=()):
+    """
+    Refresh the index after cards of the deck changed.
+    card_ids are cards with a new or changed translation, removed are
+    translations that may be gone from the deck. Only cards whose
+    distractors are affected are written.
+    """
+    cards = list(
+        Card.objects.filter(deck_id=deck_id)
+        .only('id', 'translation', 'distractors')
+    )
+    index = DistractorIndex(card.translation for card in cards)
+    changed = {card.id: card for card in cards if card.id in card_ids}
+    added = {card.translation for card in changed.values()}
+    removed = set(removed)
+    updated = []
+
+    for card in cards:
+        distractors = card.distractors or []
+        if (
+            card.id in changed
+            or removed.intersection(distractors)
+            or len(distractors) < min(INDEX_SIZE, len(index.translations) - 1)
+        ):
+            card.distractors = index.find(card.translation)
+            updated.append(card)
+            continue
+
+        # distractors are stored best first, so the last one is the
+        # only one a new translation has to beat
+        new = [
+            (confusability(card.translation, translation), translation)
+            for translation in added - set(distractors) - {card.translation}
+        ]
+        worst = (
+            confusability(card.translation, distractors[-1]), distractors[-1]
+        ) if distractors and new else None
+        if worst and max(new) > worst:
+            scored = new + [
+                (confusability(card.translation, distractor), distractor)
+                for distractor in distractors
+            ]
+            card.distractors = [
+                distractor for _, distractor
+                in heapq.nlargest(INDEX_SIZE, scored)
+            ]
+            updated.append(card)
+
+    Card.objects.bulk_update(updated, ['distractors'], batch_size=500)
+    return len(updated)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from cards.retention import (
+    BATCH_SIZE, archive_learning_log, retention_horizon
+)
+
+
+class Command(BaseCommand):
+    help = "Archives and deletes learning logs older than the retention"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Keep logs of this many last days, '
+                 'LEARNING_LOG_RETENTION_DAYS by default'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            help='Directory for the archives, '
+                 'LEARNING_LOG_ARCHIVE_DIR by default'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Rows archived and deleted at a time'
+        )
+
+    def handle(self, *args, **options):
+        before = retention_horizon(options['days'])
+        self.stdout.write(f'Archiving learning logs created before {before}')
+
+        archived = archive_learning_log(
+            before=before,
+            archive_dir=options['archive_dir'],
+            batch_size=options['batch_size']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully archived {archived} logs')
+        )
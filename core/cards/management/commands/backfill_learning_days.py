@@ -0,0 +1,57 @@
+from tqdm import tqdm
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+from cards.models import LearningDay, LearningLog
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuilds daily learning counts from the learning log"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            help='Only rebuild the counts of this user id'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(learning_log__isnull=False).distinct()
+        if options['user']:
+            users = users.filter(id__in=options['user'])
+        user_ids = list(users.order_by('id').values_list('id', flat=True))
+
+        self.stdout.write(f'Processing {len(user_ids)} users')
+
+        days = 0
+        for user_id in tqdm(user_ids):
+            log_data = (
+                LearningLog.objects.filter(user_id=user_id)
+                .annotate(date=TruncDate('created_at'))
+                .values('date')
+                .annotate(count=Count('id'))
+                .order_by('date')
+            )
+            learning_days = [
+                LearningDay(
+                    user_id=user_id, date=data['date'], count=data['count']
+                )
+                for data in log_data
+            ]
+            LearningDay.objects.bulk_create(
+                learning_days,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['user', 'date'],
+                update_fields=['count']
+            )
+            days += len(learning_days)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully backfilled {days} days')
+        )
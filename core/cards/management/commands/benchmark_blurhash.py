@@ -0,0 +1,85 @@
+import time
+
+import blurhash
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from cards import hashing
+from cards.models import Deck, Card, CardAdditionalImage
+
+
+def _timed(encode, path):
+    start = time.perf_counter()
+    with open(path, 'rb') as image_file:
+        hash = encode(image_file, x_components=4, y_components=3)
+    return hash, time.perf_counter() - start
+
+
+def _difference(hash, other, size=32):
+    """
+    Mean pixel difference of the decoded placeholders, 0 to 255
+    """
+    decoded = [
+        np.asarray(blurhash.decode(value, size, size), dtype=np.float64)
+        for value in (hash, other)
+    ]
+    return np.abs(decoded[0] - decoded[1]).mean()
+
+
+class Command(BaseCommand):
+    help = "Compares the reduced blurhash encoder with the full image one"
+    models = [Deck, Card, CardAdditionalImage]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            help='Image files, stored images of the models by default'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--size', type=int, default=hashing.SIZE)
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self._get_paths(options['limit'])
+        if not paths:
+            self.stdout.write('No images to compare')
+            return
+
+        def reduced(image_file, **kwargs):
+            return hashing.encode(image_file, size=options['size'], **kwargs)
+
+        full_total = reduced_total = difference = 0
+        same = 0
+        for path in paths:
+            full_hash, full_time = _timed(blurhash.encode, path)
+            reduced_hash, reduced_time = _timed(reduced, path)
+            full_total += full_time
+            reduced_total += reduced_time
+            same += full_hash == reduced_hash
+            difference += _difference(full_hash, reduced_hash)
+            self.stdout.write(
+                f'{path}: {full_time * 1000:.1f} ms {full_hash}, '
+                f'{reduced_time * 1000:.1f} ms {reduced_hash}'
+            )
+
+        self.stdout.write(
+            f'Full: {full_total / len(paths) * 1000:.1f} ms per image, '
+            f'reduced: {reduced_total / len(paths) * 1000:.1f} ms per image, '
+            f'{full_total / reduced_total:.0f}x faster'
+        )
+        self.stdout.write(
+            f'Mean placeholder pixel difference: {difference / len(paths):.2f}'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Same hash for {same} of {len(paths)} images')
+        )
+
+    def _get_paths(self, limit):
+        paths = []
+        for model in self.models:
+            items = model.objects.exclude(image='').exclude(image=None)
+            for item in items[:limit - len(paths)]:
+                paths.append(item.image.path)
+            if len(paths) >= limit:
+                break
+        return paths
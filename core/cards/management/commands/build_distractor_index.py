@@ -0,0 +1,33 @@
+from tqdm import tqdm
+from django.core.management.base import BaseCommand
+
+from cards.models import Deck
+from cards.distractors import build_deck_index
+
+
+class Command(BaseCommand):
+    help = "Builds the distractor index for all decks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--deck',
+            type=int,
+            action='append',
+            help='Only build the index for this deck id'
+        )
+
+    def handle(self, *args, **options):
+        decks = Deck.objects.order_by('id')
+        if options['deck']:
+            decks = decks.filter(id__in=options['deck'])
+        total = decks.count()
+
+        self.stdout.write(f'Processing {total} decks')
+
+        cards = 0
+        for deck_id in tqdm(decks.values_list('id', flat=True), total=total):
+            cards += build_deck_index(deck_id)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully indexed {cards} cards')
+        )
@@ -1,26 +1,188 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
 from tqdm import tqdm
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from cards.hashing import file_digest, hash_file
+from cards.models import Deck, Card, CardAdditionalImage, HashedImage
+
+CHECKPOINT = 'generate_blurhash.checkpoint.json'
+
 
-from cards.models import Deck, Card, CardAdditionalImage
-from cards.utils import generate_hash_for_instance
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 class Command(BaseCommand):
-    help = "Closes the specified poll for voting"
+    help = (
+        "Generates blurhashes of the images of decks and cards, images "
+        "with the same content share one hashed image"
+    )
     models = [Deck, Card, CardAdditionalImage]
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Hash images again even if their content is known'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Processes hashing images, all CPUs by default'
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint',
+            default=CHECKPOINT,
+            help='File recording progress, an interrupted run resumes '
+                 'from it'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint and start over'
+        )
+
     def handle(self, *args, **options):
-        for model in self.models:
-            items = model.objects.all()
-            total = items.count()
+        self.checkpoint_path = options['checkpoint']
+        self.checkpoint = {} if options['restart'] else self._load_checkpoint()
+        workers = max(options['workers'] or 1, 1)
+
+        executor = ProcessPoolExecutor(workers) if workers > 1 else None
+        try:
+            hashed = sum(
+                self._process(model, options, executor)
+                for model in self.models
+            )
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        deleted = HashedImage.objects.delete_unused()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully generated {hashed} hashed images, '
+                f'deleted {deleted} unused'
+            )
+        )
 
-            self.stdout.write(
-                f'Processing {total} instances of {model.__name__}'
+    def _process(self, model, options, executor):
+        items = (
+            model.objects.exclude(Q(image='') | Q(image__isnull=True))
+            .filter(pk__gt=self.checkpoint.get(model._meta.label, 0))
+            .select_related('hashed_image')
+            .only('id', 'image', 'hashed_image')
+            .order_by('pk')
+        )
+        if not options['force']:
+            # Without a digest the row predates sharing by content
+            items = items.filter(
+                Q(hashed_image__isnull=True)
+                | Q(hashed_image__hash__isnull=True)
+                | Q(hashed_image__digest__isnull=True)
             )
+        total = items.count()
+
+        self.stdout.write(f'Processing {total} instances of {model.__name__}')
+
+        chunk_size = options['chunk_size']
+        hashed = 0
+        with tqdm(total=total) as progress:
+            for chunk in _chunks(items.iterator(chunk_size), chunk_size):
+                hashed += self._hash_chunk(model, chunk, options, executor)
+                self.checkpoint[model._meta.label] = chunk[-1].pk
+                self._save_checkpoint()
+                progress.update(len(chunk))
+        return hashed
+
+    def _map(self, executor, function, values):
+        if executor:
+            return list(executor.map(function, values))
+        return [function(value) for value in values]
 
-            for item in tqdm(items, total=total):
-                generate_hash_for_instance(item)
+    def _hash_chunk(self, model, items, options, executor):
+        """
+        Hash the images of a chunk whose content is not known yet and
+        point every item at the hashed image of its content
+        """
+        digests = self._map(
+            executor, file_digest, [item.image.path for item in items]
+        )
+        known = {} if options['force'] else HashedImage.objects.in_bulk(
+            filter(None, digests), field_name='digest'
+        )
 
-            self.stdout.write(
-                self.style.SUCCESS('Successfully generated hashed images')
+        new = {}
+        for item, digest in zip(items, digests):
+            if digest is None or digest in known or digest in new:
+                continue
+            hashed_image = item.hashed_image
+            if hashed_image and hashed_image.hash and not options['force']:
+                # Same content, same hash: reuse it without encoding
+                new[digest] = HashedImage(
+                    digest=digest, hash=hashed_image.hash
+                )
+            else:
+                new[digest] = HashedImage(digest=digest)
+        unhashed = {
+            digest: item.image.path
+            for item, digest in zip(items, digests)
+            if digest in new and new[digest].hash is None
+        }
+        hashes = self._map(executor, hash_file, list(unhashed.values()))
+        for digest, hash in zip(unhashed, hashes):
+            new[digest].hash = hash
+
+        # Known rows are written too: the upsert locks them against
+        # delete_unused() and restores any deleted since they were read
+        rows = {
+            digest: HashedImage(digest=digest, hash=known[digest].hash)
+            for digest in digests if digest in known
+        }
+        rows.update(new)
+        with transaction.atomic():
+            HashedImage.objects.bulk_create(
+                rows.values(),
+                update_conflicts=True,
+                unique_fields=['digest'],
+                update_fields=['hash']
             )
+            # Pks are not returned on conflict updates, read them back
+            known = HashedImage.objects.in_bulk(rows, field_name='digest')
+
+            # bulk_update does not send post_save, so the images are not
+            # queued for hashing again
+            changed = []
+            for item, digest in zip(items, digests):
+                if digest and item.hashed_image_id != known[digest].id:
+                    item.hashed_image = known[digest]
+                    changed.append(item)
+            model.objects.bulk_update(changed, ['hashed_image'])
+        return len(hashes)
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return {}
+        self.stdout.write(f'Resuming from {self.checkpoint_path}')
+        return checkpoint
+
+    def _save_checkpoint(self):
+        # Replace atomically, an interrupted write keeps the old checkpoint
+        path = f'{self.checkpoint_path}.tmp'
+        with open(path, 'w') as checkpoint_file:
+            json.dump(self.checkpoint, checkpoint_file)
+        os.replace(path, self.checkpoint_path)
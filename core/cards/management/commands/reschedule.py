@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.models import CardProgress
+from cards.scheduling import SCHEDULERS, get_scheduler
+
+
+class Command(BaseCommand):
+    help = "Converts card progress from one scheduler to another"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='source',
+            required=True,
+            choices=sorted(SCHEDULERS),
+            help='Scheduler the progress was stored with'
+        )
+        parser.add_argument(
+            '--to',
+            dest='target',
+            choices=sorted(SCHEDULERS),
+            help='Scheduler to convert to, CARDS_SCHEDULER by default'
+        )
+        parser.add_argument(
+            '--deck',
+            type=int,
+            action='append',
+            help='Only reschedule progress of this deck id'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            help='Only reschedule progress of this user id'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            target = get_scheduler(options['target'])
+        except ValueError as e:
+            raise CommandError(e)
+        source = get_scheduler(options['source'])
+
+        filters = {}
+        if options['deck']:
+            filters['deck_id__in'] = options['deck']
+        if options['user']:
+            filters['user_id__in'] = options['user']
+
+        self.stdout.write(f'Rescheduling from {source.name} to {target.name}')
+        updated = CardProgress.objects.reschedule(
+            target,
+            source,
+            chunk_size=options['chunk_size'],
+            **filters
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rescheduled {updated} cards')
+        )
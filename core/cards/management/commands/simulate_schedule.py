@@ -0,0 +1,134 @@
+import json
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from cards import scheduling
+from cards.simulator import DEFAULT_ANSWERS, default_rules, simulate
+
+STAGE_NAMES = {
+    'new': scheduling.NEW,
+    'learning': scheduling.LEARNING,
+    'review': scheduling.REVIEW,
+    'relearning': scheduling.RELEARNING,
+}
+
+
+def _numbers(value, count):
+    try:
+        numbers = [float(number) for number in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise CommandError(
+            f'Expected {count} comma separated numbers: {value}'
+        )
+    return numbers
+
+
+class Command(BaseCommand):
+    help = "Simulates the daily load of the scheduling rules"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument(
+            '--new-per-day',
+            type=int,
+            default=0,
+            help='New cards due a day, all on the first day by default'
+        )
+        parser.add_argument(
+            '--max-cards',
+            type=int,
+            default=0,
+            help='Cards learned a day at most, unlimited by default'
+        )
+        parser.add_argument(
+            '--answers',
+            help='Probabilities of again,hard,good for all stages'
+        )
+        parser.add_argument(
+            '--answers-file',
+            help='JSON file with again,hard,good probabilities per stage '
+                 'name, e.g. {"new": [0.2, 0.2, 0.6]}'
+        )
+        parser.add_argument('--default-ease', type=float)
+        parser.add_argument('--min-ease', type=float)
+        parser.add_argument(
+            '--ease-steps',
+            help='Ease change of again,hard,good'
+        )
+        parser.add_argument(
+            '--good-review-ease',
+            type=float,
+            help='Ease change of good in the review stage'
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=7,
+            help='Report every this many days'
+        )
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        result = simulate(
+            options['cards'],
+            options['days'],
+            answers=self._get_answers(options),
+            rules=self._get_rules(options),
+            new_per_day=options['new_per_day'],
+            max_cards=options['max_cards'],
+            seed=options['seed']
+        )
+
+        self.stdout.write(
+            f'{"day":>6} {"due":>10} {"reviews":>10} {"backlog":>10}'
+        )
+        for day in range(0, options['days'], options['every']):
+            self.stdout.write(
+                f'{day:>6} {result.due[day]:>10} '
+                f'{result.reviews[day]:>10} {result.backlog[day]:>10}'
+            )
+
+        reached = result.review_days[result.review_days >= 0]
+        self.stdout.write(
+            f'Reviews: {result.reviews.sum()} total, '
+            f'{result.reviews.max()} at the busiest day'
+        )
+        if len(reached):
+            self.stdout.write(
+                f'Review stage: {len(reached) / options["cards"]:.1%} of '
+                f'cards, median {np.median(reached):.0f} days, '
+                f'90th percentile {np.percentile(reached, 90):.0f} days'
+            )
+        else:
+            self.stdout.write('Review stage: no cards')
+
+    def _get_answers(self, options):
+        answers = dict(DEFAULT_ANSWERS)
+        if options['answers']:
+            probabilities = _numbers(options['answers'], 3)
+            answers = {stage: probabilities for stage in answers}
+        if options['answers_file']:
+            with open(options['answers_file']) as answers_file:
+                exported = json.load(answers_file)
+            for name, probabilities in exported.items():
+                if name not in STAGE_NAMES or len(probabilities) != 3:
+                    raise CommandError(f'Invalid answers for stage: {name}')
+                answers[STAGE_NAMES[name]] = probabilities
+        return answers
+
+    def _get_rules(self, options):
+        rules = default_rules()
+        changes = {}
+        for option in ('default_ease', 'min_ease', 'good_review_ease'):
+            if options[option] is not None:
+                changes[option] = round(options[option] * 100)
+        if options['ease_steps']:
+            changes['ease_steps'] = tuple(
+                round(step * 100)
+                for step in _numbers(options['ease_steps'], 3)
+            )
+        return rules._replace(**changes)
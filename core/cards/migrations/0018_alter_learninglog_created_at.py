@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0017_alter_cardprogress_ease_learntoday'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='learninglog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0018_alter_learninglog_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cardprogress',
+            index=models.Index(fields=['user', 'due'], include=('priority', 'card', 'id'), name='cardprogress_user_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardprogress',
+            index=models.Index(fields=['card', 'user'], include=('due', 'priority', 'id'), name='cardprogress_card_user_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_deck(apps, schema_editor):
+    CardProgress = apps.get_model('cards', 'CardProgress')
+    Card = apps.get_model('cards', 'Card')
+    CardProgress.objects.update(
+        deck=models.Subquery(
+            Card.objects.filter(
+                pk=models.OuterRef('card_id')
+            ).values('deck_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0019_cardprogress_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cardprogress',
+            name='cardprogress_user_due_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cardprogress',
+            name='cardprogress_card_user_idx',
+        ),
+        migrations.AddField(
+            model_name='cardprogress',
+            name='deck',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='card_progress', to='cards.deck'),
+        ),
+        migrations.RunPython(populate_deck, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cardprogress',
+            name='deck',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_progress', to='cards.deck'),
+        ),
+        migrations.AddIndex(
+            model_name='cardprogress',
+            index=models.Index(fields=['user', 'deck', 'due'], include=('priority', 'card', 'id'), name='cardprogress_user_deck_due_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keep the oldest progress row for every (user, card) pair
+    """
+    CardProgress = apps.get_model('cards', 'CardProgress')
+    duplicates = (
+        CardProgress.objects.values('user', 'card')
+        .annotate(first_id=models.Min('id'), count=models.Count('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        CardProgress.objects.filter(
+            user=duplicate['user'],
+            card=duplicate['card']
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0020_cardprogress_deck'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cardprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'card'), name='unique_card_progress'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:02
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_learning_decks(apps, schema_editor):
+    """
+    Every deck the user has progress in becomes a learning deck and
+    progress rows that were never answered are dropped, they are
+    implied by the learning deck now
+    """
+    CardProgress = apps.get_model('cards', 'CardProgress')
+    LearningDeck = apps.get_model('cards', 'LearningDeck')
+    today = django.utils.timezone.now().date()
+
+    enrolments = (
+        CardProgress.objects.values('user', 'deck')
+        .annotate(date=models.Min('due'))
+        .order_by()
+    )
+    LearningDeck.objects.bulk_create(
+        [
+            LearningDeck(
+                user_id=enrolment['user'],
+                deck_id=enrolment['deck'],
+                date=min(enrolment['date'], today)
+            )
+            for enrolment in enrolments.iterator()
+        ],
+        batch_size=1000
+    )
+    CardProgress.objects.filter(
+        stage=0,
+        priority=1,
+        ease=Decimal('1.05')
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cards', '0021_cardprogress_unique_user_card'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearningDeck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_decks', to='cards.deck')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_decks', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='learningdeck',
+            constraint=models.UniqueConstraint(fields=('user', 'deck'), name='unique_learning_deck'),
+        ),
+        migrations.RunPython(
+            create_learning_decks,
+            migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0022_learningdeck'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='distractors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    LearnToday = apps.get_model('cards', 'LearnToday')
+    keep = (
+        LearnToday.objects
+        .values('user', 'deck', 'date')
+        .annotate(keep_id=models.Min('id'))
+        .values('keep_id')
+    )
+    LearnToday.objects.exclude(id__in=keep).delete()
+    LearnToday.objects.update(cards_left=models.F('cards_total'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0023_card_distractors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='learntoday',
+            name='cards_left',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='learntoday',
+            constraint=models.UniqueConstraint(fields=('user', 'deck', 'date'), name='unique_learn_today'),
+        ),
+    ]
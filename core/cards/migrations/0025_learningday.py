@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cards', '0024_learntoday_cards_left'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearningDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_days', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='learningday',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_learning_day'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0025_learningday'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='learninglog',
+            index=models.Index(fields=['created_at', 'id'], name='learninglog_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0026_learninglog_created_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardprogress',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0027_cardprogress_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hashedimage',
+            name='digest',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='card',
+            name='hashed_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cards.hashedimage'),
+        ),
+        migrations.AlterField(
+            model_name='cardadditionalimage',
+            name='hashed_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cards.hashedimage'),
+        ),
+        migrations.AlterField(
+            model_name='deck',
+            name='hashed_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cards.hashedimage'),
+        ),
+    ]
@@ -1,6 +1,80 @@
+from django.db import models
+
+from core import identity_map
+
+
 class HashedImageMixin:
     @property
     def image_hash(self):
-        if self.hashed_image:
-            return self.hashed_image.hash
-        return None
+        if not self.hashed_image_id:
+            return None
+        if not type(self).hashed_image.is_cached(self):
+            # Rows shared in the request are loaded once
+            self.hashed_image = identity_map.get(
+                self._meta.get_field('hashed_image').related_model,
+                self.hashed_image_id
+            )
+        return self.hashed_image.hash
+
+
+class DirtyFieldsMixin:
+    """
+    Remembers tracked_fields as loaded or last saved, so saves and
+    their signals can tell which of them changed
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = instance._tracked_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Fields left out of update_fields were not written
+        self._remember(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember(fields)
+
+    def _remember(self, fields=None):
+        values = self._tracked_values()
+        if fields is not None:
+            values = {
+                name: value for name, value in values.items()
+                if name in fields
+                or self._meta.get_field(name).attname in fields
+            }
+        self._loaded = {**getattr(self, '_loaded', {}), **values}
+
+    def _tracked_values(self):
+        values = {}
+        for name in self.tracked_fields:
+            field = self._meta.get_field(name)
+            if field.attname not in self.__dict__:
+                continue
+            value = self.__dict__[field.attname]
+            if isinstance(field, models.FileField):
+                # A name or a FieldFile, empty as '' or None
+                value = getattr(value, 'name', value) or None
+            values[name] = value
+        return values
+
+    def loaded_value(self, name):
+        """
+        Value of a tracked field as loaded or last saved, None if unknown
+        """
+        return getattr(self, '_loaded', {}).get(name)
+
+    def changed_fields(self):
+        """
+        Tracked fields changed since loaded or last saved, all of them
+        for rows not loaded from the database
+        """
+        loaded = getattr(self, '_loaded', {})
+        return {
+            name for name, value in self._tracked_values().items()
+            if name not in loaded or loaded[name] != value
+        }
@@ -1,24 +1,79 @@
+from collections import Counter
 from collections.abc import Iterable
 from decimal import Decimal
 
-from datetime import timedelta
-from django.db import models
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db import IntegrityError, connection, models, transaction
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db.models.functions import JSONObject
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from .mixins import HashedImageMixin
+from . import hashing, queues, scheduling
+from .mixins import DirtyFieldsMixin, HashedImageMixin
 
 User = get_user_model()
 
 
+class HashedImageManager(models.Manager):
+    def for_file(self, path, digest=None):
+        """
+        HashedImage of the file content, the image is only hashed when
+        the content is new. None when the file is missing. The row stays
+        locked until the transaction commits, so delete_unused() leaves
+        it alone while an instance is pointed at it.
+        """
+        digest = digest or hashing.file_digest(path)
+        if digest is None:
+            return None
+        hash = None
+        while True:
+            hashed_image = (
+                self.select_for_update().filter(digest=digest).first()
+            )
+            if hashed_image is not None:
+                return hashed_image
+            if hash is None:
+                hash = hashing.hash_file(path)
+            try:
+                with transaction.atomic():
+                    return self.create(digest=digest, hash=hash)
+            except IntegrityError:
+                # Created concurrently, lock that row instead
+                continue
+
+    @transaction.atomic
+    def delete_unused(self):
+        """
+        Delete rows nothing points at. Rows locked by for_file() are
+        skipped, locked ones are checked again before deleting, as they
+        may have been pointed at since the first check.
+        """
+        unused = self.filter(deck=None, card=None, cardadditionalimage=None)
+        pks = list(
+            unused.select_for_update(skip_locked=True, of=('self',))
+            .values_list('pk', flat=True)
+        )
+        return unused.filter(pk__in=pks).delete()[0]
+
+
 class HashedImage(models.Model):
     hash = models.CharField(max_length=255, null=True, blank=True)
+    # SHA-256 of the image file, images with the same content share a row
+    digest = models.CharField(
+        max_length=64, unique=True, null=True, blank=True
+    )
+
+    objects = HashedImageManager()
 
     def __str__(self):
         return f'HasedImage: {self.hash}'
 
 
-class Deck(models.Model, HashedImageMixin):
+class Deck(DirtyFieldsMixin, models.Model, HashedImageMixin):
     title = models.CharField(max_length=255)
     default = models.BooleanField('Default Deck', default=False)
     user = models.ForeignKey(
@@ -30,26 +85,25 @@ class Deck(models.Model, HashedImageMixin):
     image = models.ImageField(upload_to='decks/', blank=True, null=True)
     hashed_image = models.ForeignKey(
         'cards.HashedImage',
-        on_delete=models.CASCADE,
+        on_delete=models.SET_NULL,
         null=True,
         blank=True
     )
 
+    tracked_fields = ('image',)
+
     def __str__(self):
         return self.title
 
     def add_to_user(self, user):
         """
-        Add all cards from the Deck to user's learning progress
+        Add the Deck to user's learning decks. Progress rows are created
+        only when a card is answered for the first time.
         """
-        for card in self.cards.all():
-            CardProgress.objects.get_or_create(
-                user=user,
-                card=card
-            )
+        LearningDeck.objects.get_or_create(user=user, deck=self)
 
 
-class Card(models.Model, HashedImageMixin):
+class Card(DirtyFieldsMixin, models.Model, HashedImageMixin):
     deck = models.ForeignKey(
         Deck,
         on_delete=models.CASCADE,
@@ -61,16 +115,39 @@ class Card(models.Model, HashedImageMixin):
     image = models.ImageField(upload_to='cards/', blank=True, null=True)
     hashed_image = models.ForeignKey(
         'cards.HashedImage',
-        on_delete=models.CASCADE,
+        on_delete=models.SET_NULL,
         null=True,
         blank=True
     )
+    # Most confusable translations of the deck, see cards.distractors
+    distractors = models.JSONField(default=list, blank=True)
+
+    tracked_fields = ('deck', 'word', 'translation', 'image')
 
     def __str__(self):
         return f'{self.word} | {self.translation}'
 
+    def save(self, *args, **kwargs):
+        previous_deck_id = self.loaded_value('deck')
+        deck_changed = self.pk is not None and 'deck' in self.changed_fields()
+        super().save(*args, **kwargs)
+
+        if deck_changed:
+            # Keep denormalized CardProgress.deck in sync
+            progress = CardProgress.objects.filter(card=self)
+            queue = queues.get_due_queue()
+            if queue is not None:
+                user_ids = set(progress.values_list('user_id', flat=True))
+                queue.invalidate(
+                    (user_id, deck_id)
+                    for user_id in user_ids
+                    for deck_id in (previous_deck_id, self.deck_id)
+                    if deck_id is not None
+                )
+            progress.update(deck=self.deck_id)
 
-class CardAdditionalImage(models.Model, HashedImageMixin):
+
+class CardAdditionalImage(DirtyFieldsMixin, models.Model, HashedImageMixin):
     card = models.ForeignKey(
         Card,
         on_delete=models.CASCADE,
@@ -79,32 +156,468 @@ class CardAdditionalImage(models.Model, HashedImageMixin):
     image = models.ImageField(upload_to='cards_additional/')
     hashed_image = models.ForeignKey(
         'cards.HashedImage',
-        on_delete=models.CASCADE,
+        on_delete=models.SET_NULL,
         null=True,
         blank=True
     )
 
+    tracked_fields = ('image',)
+
     def __str__(self):
         return f'Additional image for {self.card.word}'
 
 
 class CardProgressManager(models.Manager):
-    def pop_card(self, user, deck):
+    """
+    Cards of a learning deck the user has never answered have no progress
+    row. They are treated as NEW cards due on the day the deck was added
+    and come back from here as unsaved CardProgress instances.
+    """
+    PROGRESS_FIELDS = ('id', 'stage', 'due', 'ease', 'priority', 'version')
+
+    def due_cards(self, user, deck):
         """
-        Get first card to learn
+        Answered cards to learn in the order they should be shown
         """
         return self.filter(
             user=user,
-            card__deck=deck,
-            due__lte=timezone.now()
-        ).order_by('priority').first()
+            deck=deck,
+            due__lte=timezone.now().date()
+        ).order_by('priority')
+
+    def due_on(self, user, deck, date):
+        return self.filter(user=user, deck=deck, due=date)
+
+    def new_cards(self, user, deck):
+        """
+        Cards the user has never answered, annotated with enrolled_on.
+        Empty if the user does not learn the deck.
+        """
+        return Card.objects.filter(deck=deck).annotate(
+            enrolled_on=models.Subquery(
+                LearningDeck.objects.filter(
+                    user=user,
+                    deck=deck
+                ).values('date')[:1]
+            )
+        ).filter(
+            ~models.Exists(self.filter(user=user, card=models.OuterRef('pk'))),
+            enrolled_on__isnull=False
+        ).order_by('id')
+
+    def _new_progress(self, user, deck, card):
+        card.deck = deck
+        return self.model(
+            user=user,
+            card=card,
+            deck=deck,
+            due=card.enrolled_on,
+            ease=Decimal(str(self.model.DEFAULT_EASE))
+        )
+
+    def next_cards(self, user, deck, limit=1):
+        """
+        Next cards to learn: reviews first, then never answered cards,
+        then cards that were already failed today
+        """
+        first_due = self.due_cards(user, deck).values('pk')[:limit]
+        due = list(
+            self.filter(pk__in=first_due)
+            .select_related('card__hashed_image')
+            .order_by('priority')
+        )
+        for progress in due:
+            progress.card.deck = deck
+
+        reviews = [progress for progress in due if progress.priority <= 1]
+        if len(reviews) >= limit:
+            return reviews[:limit]
+
+        new = [
+            self._new_progress(user, deck, card)
+            for card in self.new_cards(user, deck).select_related(
+                'hashed_image'
+            )[:limit - len(reviews)]
+        ]
+        failed = [progress for progress in due if progress.priority > 1]
+        return (reviews + new + failed)[:limit]
+
+    def pop_card(self, user, deck):
+        """
+        Get first card to learn. The due cards are picked from
+        cardprogress_user_deck_due_idx alone, only the picked row is
+        read from the table. With a due queue enabled they are picked
+        from the queue, a cold queue is filled and the SQL path used.
+        """
+        queue = queues.get_due_queue()
+        if queue is not None:
+            if queue.is_warm(user.id, deck.id):
+                return self._pop_queued(queue, user, deck)
+            self.fill_queue(queue, user.id, deck.id)
+
+        return self.next_card(user, deck)
+
+    def _with_progress(self, cards, user, deck):
+        """
+        Annotate cards with the user's progress columns and the
+        enrolment date of the deck
+        """
+        return cards.annotate(
+            user_progress=models.FilteredRelation(
+                'card_progress',
+                condition=models.Q(card_progress__user=user)
+            )
+        ).annotate(
+            enrolled_on=models.Subquery(
+                LearningDeck.objects.filter(
+                    user=user,
+                    deck=deck
+                ).values('date')[:1]
+            ),
+            **{
+                f'progress_{field}': models.F(f'user_progress__{field}')
+                for field in self.PROGRESS_FIELDS
+            }
+        )
+
+    def _with_images(self, cards):
+        """
+        Annotate cards with their additional images and hashes as JSON,
+        so they are read by the same query. Like answer this needs
+        PostgreSQL.
+        """
+        images = CardAdditionalImage.objects.filter(
+            card=models.OuterRef('pk')
+        ).order_by().values('card').annotate(
+            data=JSONBAgg(
+                JSONObject(
+                    id='id',
+                    card_id='card_id',
+                    image='image',
+                    hashed_image_id='hashed_image_id',
+                    hash='hashed_image__hash',
+                    digest='hashed_image__digest'
+                ),
+                ordering='id'
+            )
+        ).values('data')
+        return cards.annotate(images=models.Subquery(images))
+
+    def _set_images(self, card):
+        """
+        Load the images annotated by _with_images like a prefetch of
+        card.additional_images with their hashed images
+        """
+        images = []
+        for row in card.images or []:
+            image = CardAdditionalImage.from_db(
+                self.db,
+                ['id', 'card_id', 'image', 'hashed_image_id'],
+                [row['id'], card.pk, row['image'], row['hashed_image_id']]
+            )
+            hashed_image = row['hashed_image_id'] and HashedImage.from_db(
+                self.db,
+                ['id', 'hash', 'digest'],
+                [row['hashed_image_id'], row['hash'], row['digest']]
+            )
+            CardAdditionalImage.hashed_image.field.set_cached_value(
+                image, hashed_image or None
+            )
+            CardAdditionalImage.card.field.set_cached_value(image, card)
+            images.append(image)
+
+        queryset = card.additional_images.all()
+        queryset._result_cache = images
+        queryset._prefetch_done = True
+        card._prefetched_objects_cache = {'additional_images': queryset}
+
+    def _progress_for(self, user, deck, card):
+        """
+        Progress of a card loaded by _with_progress, unsaved for a never
+        answered card and None if the user does not learn the deck
+        """
+        card.deck = deck
+        if card.progress_id is None:
+            if card.enrolled_on is None:
+                return None
+            return self._new_progress(user, deck, card)
+
+        progress = self.model(
+            user=user,
+            card=card,
+            deck=deck,
+            **{
+                field: getattr(card, f'progress_{field}')
+                for field in self.PROGRESS_FIELDS
+            }
+        )
+        progress._state.adding = False
+        progress._state.db = self.db
+        return progress
+
+    def next_card(self, user, deck):
+        """
+        pop_card in a single query: the first due card and the first
+        never answered card are read together with their progress and
+        images, then ordered like next_cards
+        """
+        first_due = self.due_cards(user, deck).values('card_id')[:1]
+        first_new = self.new_cards(user, deck).values('id')[:1]
+        cards = self._with_images(self._with_progress(
+            Card.objects.filter(
+                models.Q(id__in=first_due) | models.Q(id__in=first_new)
+            ).select_related('hashed_image'),
+            user,
+            deck
+        ))
+        for card in cards:
+            self._set_images(card)
+        progresses = [self._progress_for(user, deck, card) for card in cards]
+        progresses = [progress for progress in progresses if progress]
+        due = [progress for progress in progresses if progress.pk]
+        new = [progress for progress in progresses if not progress.pk]
+        if due and due[0].priority <= 1:
+            return due[0]
+        return (new + due or [None])[0]
+
+    def answer_target(self, user, deck_id, card_id):
+        """
+        Progress to apply an answer to with its card and deck, read in
+        a single query. Raises DoesNotExist like get_for_answer.
+        """
+        card = self._with_progress(
+            Card.objects.filter(id=card_id, deck_id=deck_id)
+            .select_related('deck', 'hashed_image'),
+            user,
+            deck_id
+        ).first()
+        progress = card and self._progress_for(user, card.deck, card)
+        if progress is None:
+            raise self.model.DoesNotExist(f'No progress for card {card_id}')
+        return progress
+
+    def fill_queue(self, queue, user_id, deck_id):
+        queue.fill(
+            user_id,
+            deck_id,
+            self.filter(user_id=user_id, deck_id=deck_id).values_list(
+                'card_id', 'due', 'priority'
+            )
+        )
+
+    def _pop_queued(self, queue, user, deck):
+        """
+        pop_card through the queue: reviews, never answered cards, then
+        failed cards. Entries the database disagrees with are dropped.
+        """
+        today = timezone.now().date()
+        for kind in (queues.REVIEWS, None, queues.FAILED):
+            if kind is None:
+                card = self.new_cards(user, deck).select_related(
+                    'hashed_image'
+                ).first()
+                if card:
+                    return self._new_progress(user, deck, card)
+                continue
+
+            while (card_id := queue.first(user.id, deck.id, kind, today)):
+                progress = self.filter(
+                    user=user, deck=deck, card_id=card_id
+                ).select_related('card__hashed_image').first()
+                if progress is None:
+                    queue.discard(user.id, deck.id, card_id)
+                    continue
+                if (
+                    progress.due > today
+                    or queues.kind(progress.priority) != kind
+                ):
+                    queue.update([progress])
+                    continue
+                progress.card.deck = deck
+                return progress
+        return None
+
+    def get_for_answer(self, user, deck, card_id):
+        """
+        Progress to apply an answer to, unsaved for a never answered card
+        """
+        progress = self.filter(user=user, deck=deck, card_id=card_id).first()
+        if progress:
+            return progress
+
+        card = self.new_cards(user, deck).filter(id=card_id).first()
+        if card is None:
+            raise self.model.DoesNotExist(f'No progress for card {card_id}')
+        return self._new_progress(user, deck, card)
+
+    def words_left(self, user, deck):
+        """
+        Number of cards scheduled for today
+        """
+        today = timezone.now().date()
+        return (
+            self.due_on(user, deck, today).count()
+            + self.new_cards(user, deck).filter(enrolled_on=today).count()
+        )
+
+    def apply_answers(self, user, deck, answers):
+        """
+        Apply an ordered list of answers in one transaction.
+        Every answer is a dict with card_id, action and answered_at.
+        Raises DoesNotExist if any card is not learned by the user.
+        The answered rows are locked, a never answered card stored
+        concurrently restarts the transaction.
+        """
+        for _ in range(self.model.MAX_RETRIES):
+            try:
+                with transaction.atomic():
+                    progresses = self._apply_answers(user, deck, answers)
+                break
+            except IntegrityError:
+                continue
+        else:
+            raise self.model.Conflict('Cards are answered concurrently')
+
+        queue = queues.get_due_queue()
+        if queue is not None:
+            queue.update(progresses)
+        return len(answers)
+
+    def _apply_answers(self, user, deck, answers):
+        card_ids = {answer['card_id'] for answer in answers}
+        progresses = {
+            progress.card_id: progress
+            for progress in self.select_for_update().filter(
+                user=user,
+                deck=deck,
+                card_id__in=card_ids
+            )
+        }
+        missing = card_ids - progresses.keys()
+        if missing:
+            progresses.update({
+                card.id: self._new_progress(user, deck, card)
+                for card in self.new_cards(user, deck).filter(id__in=missing)
+            })
+            missing = card_ids - progresses.keys()
+        if missing:
+            raise self.model.DoesNotExist(
+                f'No progress for cards: {sorted(missing)}'
+            )
+
+        logs = []
+        left_delta = 0
+        for answer in answers:
+            progress = progresses[answer['card_id']]
+            answered_at = answer.get('answered_at') or timezone.now()
+            old_due = progress.due
+            graduated = progress.handle_action(
+                answer['action'],
+                now=answered_at,
+                commit=False
+            )
+            left_delta += LearnToday.left_delta(old_due, progress.due)
+            if graduated:
+                logs.append(LearningLog(
+                    user=user,
+                    card_id=progress.card_id,
+                    created_at=answered_at
+                ))
+
+        existing = [p for p in progresses.values() if p.pk]
+        for progress in existing:
+            progress.version += 1
+        self.bulk_update(
+            existing,
+            ['stage', 'due', 'ease', 'priority', 'version']
+        )
+        self.bulk_create(
+            [p for p in progresses.values() if not p.pk]
+        )
+        LearningLog.objects.bulk_create(logs)
+        LearningDay.objects.track(
+            user.id, [log.created_at.date() for log in logs]
+        )
+        LearnToday.objects.track(user.id, deck.id, left_delta)
+        return progresses.values()
+
+    def reschedule(self, target, source, today=None, chunk_size=1000,
+                   **filters):
+        """
+        Convert the progress matching filters from the source to the
+        target scheduler, chunk_size rows at a time. Rows are read as
+        plain values and converted with array operations, cards due
+        later than today keep the day of their last answer.
+        Every chunk is locked and bumps version like answers do, the
+        counters and due queues of the affected decks are refreshed.
+        Returns the number of updated rows.
+        """
+        today = today or timezone.now().date()
+        ordinal = today.toordinal()
+        rows = self.filter(**filters).order_by('id').values_list(
+            'id', 'user_id', 'deck_id', 'stage', 'ease', 'due', 'version'
+        )
+        queue = queues.get_due_queue()
+        last_id = 0
+        updated = 0
+        while True:
+            with transaction.atomic():
+                chunk = list(
+                    rows.filter(id__gt=last_id)
+                    .select_for_update()[:chunk_size]
+                )
+                if not chunk:
+                    return updated
+                last_id = chunk[-1][0]
+                pairs = self._reschedule_chunk(target, source, ordinal, chunk)
+            if queue is not None:
+                queue.invalidate(pairs)
+            updated += len(chunk)
+
+    def _reschedule_chunk(self, target, source, today, chunk):
+        ids, user_ids, deck_ids, stages, eases, dues, versions = zip(*chunk)
+        stage = np.array(stages, dtype=np.int64)
+        ease = np.array(eases, dtype=np.float64)
+        due = np.array([day.toordinal() for day in dues])
+
+        new_ease = np.round(
+            target.ease_for(stage, source.stability(stage, ease)), 2
+        )
+        last_answer = due - source.interval(stage, ease)
+        new_due = np.where(
+            due > today,
+            np.maximum(last_answer + target.interval(stage, new_ease), today),
+            due
+        )
+
+        self.bulk_update(
+            [
+                self.model(
+                    id=id,
+                    ease=Decimal(str(ease)),
+                    due=date.fromordinal(int(due)),
+                    version=version + 1
+                )
+                for id, ease, due, version
+                in zip(ids, new_ease, new_due, versions)
+            ],
+            ['ease', 'due', 'version']
+        )
+
+        left_deltas = Counter()
+        for user_id, deck_id, delta in zip(
+            user_ids, deck_ids, (new_due == today).astype(int) - (due == today)
+        ):
+            left_deltas[user_id, deck_id] += int(delta)
+        LearnToday.objects.track_many(left_deltas)
+        return set(zip(user_ids, deck_ids))
 
 
 class CardProgress(models.Model):
-    NEW = 0
-    LEARNING = 1
-    REVIEW = 2
-    RELEARNING = 3
+    NEW = scheduling.NEW
+    LEARNING = scheduling.LEARNING
+    REVIEW = scheduling.REVIEW
+    RELEARNING = scheduling.RELEARNING
     CARD_STAGES = (
         (NEW, 'New'),
         (LEARNING, 'Learning'),
@@ -112,7 +625,11 @@ class CardProgress(models.Model):
         (RELEARNING, 'Relearning')
     )
     DEFAULT_EASE = 1.05
-    ACTIONS = ['again', 'hard', 'good']
+    ACTIONS = list(scheduling.ACTIONS)
+    MAX_RETRIES = 5
+
+    class Conflict(Exception):
+        pass
 
     user = models.ForeignKey(
         'user.User',
@@ -124,6 +641,12 @@ class CardProgress(models.Model):
         on_delete=models.CASCADE,
         related_name='card_progress'
     )
+    # Denormalized card.deck, kept in sync by Card.save
+    deck = models.ForeignKey(
+        Deck,
+        on_delete=models.CASCADE,
+        related_name='card_progress'
+    )
     stage = models.PositiveSmallIntegerField(choices=CARD_STAGES, default=NEW)
     due = models.DateField(default=timezone.now)
     ease = models.DecimalField(
@@ -132,71 +655,243 @@ class CardProgress(models.Model):
         default=DEFAULT_EASE
     )
     priority = models.PositiveIntegerField(default=1)
+    # Incremented on every answer to detect concurrent answers
+    version = models.PositiveIntegerField(default=0)
     objects = CardProgressManager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'card'],
+                name='unique_card_progress'
+            ),
+        ]
+        indexes = [
+            # pop_card and words_left: user's due cards in a deck
+            models.Index(
+                fields=['user', 'deck', 'due'],
+                include=['priority', 'card', 'id'],
+                name='cardprogress_user_deck_due_idx'
+            ),
+        ]
+
     def __str__(self):
         return f'{self.user.username}`s progress for card {self.card.word}'
 
-    def again(self):
-        interval = 0
-        ease = max(self.ease - Decimal('0.25'), self.DEFAULT_EASE)
-        priority = self.priority + 1
-        self._update_progress(interval, priority=priority, new_ease=ease)
-
-    def hard(self):
-        interval = 0
-        ease = max(self.ease - Decimal('0.15'), self.DEFAULT_EASE)
-        priority = self.priority + 2
-        self._update_progress(interval, priority=priority, new_ease=ease)
-
-    def good(self):
-        interval = 1
-        ease = self.ease + Decimal('0.15')
-        priority = self.priority + 3
-
-        if self.stage == self.RELEARNING:
-            interval = 1
-        if self.stage == self.LEARNING:
-            interval = 2
-        if self.stage == self.REVIEW:
-            interval = 3
-            ease = self.ease + Decimal('0.25')
-
-        self._update_progress(interval, priority=priority, new_ease=ease)
-
-    def _update_progress(self, interval, priority, new_ease):
-        days_2 = 2
-        days_6 = 6
-        self.ease = new_ease
-        learning_threshold = self.ease > days_2
-        review_threshold = interval * self.ease > days_6
-
-        if self.stage == self.NEW and learning_threshold:
-            self.stage = self.LEARNING
-            interval = 1
-
-        if self.stage == self.LEARNING and review_threshold:
-            self.stage = self.REVIEW
-
-        days = int(interval * self.ease)
-        self.due = (timezone.now() + timedelta(days=days)).date()
-        self.priority = priority
-        if self.due > timezone.now().date():
-            self.store_log(self.user, self.card)
-            self.priority = 1
-
-        self.save()
-
-    def handle_action(self, action):
-        if action in ['again', 'hard', 'good']:
+    def again(self, now=None, commit=True):
+        return self._update_progress('again', now=now, commit=commit)
+
+    def hard(self, now=None, commit=True):
+        return self._update_progress('hard', now=now, commit=commit)
+
+    def good(self, now=None, commit=True):
+        return self._update_progress('good', now=now, commit=commit)
+
+    def _update_progress(self, action, now=None, commit=True):
+        """
+        Move the card to its next state, see cards.scheduling. Returns
+        True when the card leaves today's queue. With commit=False
+        nothing is written, the caller is responsible for saving the
+        row and storing the log.
+
+        With commit=True the answer is atomic: the row is updated only
+        if its version did not change since it was read, together with
+        the log and today's counters. A concurrent answer reloads the
+        row and the answer is applied again, up to MAX_RETRIES times.
+        """
+        now = now or timezone.now()
+        if not commit:
+            return self._apply(action, now).log
+
+        for _ in range(self.MAX_RETRIES):
+            old_due = self.due
+            transition = self._apply(action, now)
+            try:
+                with transaction.atomic():
+                    if transition.save and not self._write():
+                        self._reload()
+                        continue
+                    if transition.log:
+                        self.store_log(self.user, self.card, now)
+                    LearnToday.objects.track(
+                        self.user_id,
+                        self.deck_id,
+                        LearnToday.left_delta(old_due, self.due)
+                    )
+            except IntegrityError:
+                # The first answer of a new card was stored concurrently
+                self._reload()
+                continue
+
+            queue = queues.get_due_queue()
+            if queue is not None and transition.save:
+                queue.update([self])
+            return transition.log
+        raise self.Conflict(f'Card {self.card_id} is answered concurrently')
+
+    def answer(self, action, now=None):
+        """
+        Apply an answer in a single statement: the versioned progress
+        update or insert, the log, the daily count and today's counters
+        are written by one query of data-modifying CTEs, which needs
+        PostgreSQL. The counters reuse the statements of
+        LearningDay.objects.track and LearnToday.objects.track. Falls
+        back to _update_progress when the row changed concurrently.
+        Returns (graduated, (cards_total, cards_left)), the counters are
+        None when today's row does not exist yet.
+        """
+        if action not in self.ACTIONS:
+            raise ValueError(f"Invalid action: {action}")
+        now = now or timezone.now()
+        old_due = self.due
+        old_version = self.version
+        transition = self._apply(action, now)
+        if self.pk is None:
+            progress_sql = f"""
+                INSERT INTO {CardProgress._meta.db_table}
+                    (user_id, card_id, deck_id, stage, due, ease, priority,
+                     version)
+                VALUES (%(user)s, %(card)s, %(deck)s, %(stage)s, %(due)s,
+                        %(ease)s, %(priority)s, 0)
+                ON CONFLICT (user_id, card_id) DO NOTHING
+                RETURNING id
+            """
+        else:
+            progress_sql = f"""
+                UPDATE {CardProgress._meta.db_table}
+                SET stage = %(stage)s, due = %(due)s, ease = %(ease)s,
+                    priority = %(priority)s, version = version + 1
+                WHERE id = %(id)s AND version = %(version)s
+                RETURNING id
+            """
+        day_sql = LearningDay.objects._add_sql(
+            'SELECT %(user)s, %(now_date)s, 1 FROM log'
+        )
+        today_sql = LearnToday.objects._track_sql(
+            'EXISTS (SELECT 1 FROM progress)'
+        )
+        sql = f"""
+            WITH progress AS ({progress_sql}),
+            log AS (
+                INSERT INTO {LearningLog._meta.db_table}
+                    (user_id, card_id, created_at)
+                SELECT %(user)s, %(card)s, %(now)s FROM progress
+                WHERE %(log)s
+                RETURNING id
+            ),
+            day AS ({day_sql}),
+            today AS ({today_sql})
+            SELECT (SELECT id FROM progress), today.*
+            FROM (SELECT 1) AS answer LEFT JOIN today ON TRUE
+        """
+        params = {
+            'id': self.pk,
+            'version': old_version,
+            'user': self.user_id,
+            'card': self.card_id,
+            'deck': self.deck_id,
+            'stage': self.stage,
+            'due': self.due,
+            'ease': self.ease,
+            'priority': self.priority,
+            'log': transition.log,
+            'now': now,
+            'now_date': now.date(),
+            'today': timezone.now().date(),
+            'left_delta': LearnToday.left_delta(old_due, self.due),
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            progress_id, *today = cursor.fetchone()
+
+        if progress_id is None:
+            self._reload()
+            return self._update_progress(action, now=now), None
+
+        if self.pk is None:
+            self.pk = progress_id
+            self._state.adding = False
+        else:
+            self.version += 1
+        queue = queues.get_due_queue()
+        if queue is not None:
+            queue.update([self])
+
+        if today[0] is None:
+            return transition.log, None
+        counters = LearnToday(
+            user_id=today[0],
+            deck_id=today[1],
+            date=today[2],
+            cards_total=today[3],
+            cards_left=today[4]
+        )
+        LearnToday.objects._cache_counters([counters])
+        return transition.log, (counters.cards_total, counters.cards_left)
+
+    def _apply(self, action, now):
+        transition = scheduling.get_scheduler().schedule(
+            self.stage,
+            self.ease,
+            self.priority,
+            action,
+            now.date(),
+            due=self.due
+        )
+        self.stage = transition.stage
+        self.ease = transition.ease
+        self.priority = transition.priority
+        self.due = transition.due
+        return transition
+
+    def _write(self):
+        """
+        Store the state if the row still has the version it was read
+        with. A never answered card is inserted.
+        """
+        if self.pk is None:
+            self.save()
+            return True
+        updated = CardProgress.objects.filter(
+            pk=self.pk,
+            version=self.version
+        ).update(
+            stage=self.stage,
+            due=self.due,
+            ease=self.ease,
+            priority=self.priority,
+            version=models.F('version') + 1
+        )
+        if updated:
+            self.version += 1
+        return bool(updated)
+
+    def _reload(self):
+        state = CardProgress.objects.filter(
+            user_id=self.user_id,
+            card_id=self.card_id
+        ).values(
+            'id', 'deck_id', 'stage', 'due', 'ease', 'priority', 'version'
+        ).get()
+        self.pk = state.pop('id')
+        self._state.adding = False
+        for field, value in state.items():
+            setattr(self, field, value)
+
+    def handle_action(self, action, now=None, commit=True):
+        if action in self.ACTIONS:
             action_method = getattr(self, action, None)
             if callable(action_method):
-                action_method()
-                return
+                return action_method(now=now, commit=commit)
         raise ValueError(f"Invalid action: {action}")
 
-    def store_log(self, user, card):
-        LearningLog.objects.create(user=user, card=card)
+    def store_log(self, user, card, created_at=None):
+        log = LearningLog.objects.create(
+            user=user,
+            card=card,
+            created_at=created_at or timezone.now()
+        )
+        LearningDay.objects.track(user.id, [log.created_at.date()])
 
 
 class LearningLog(models.Model):
@@ -206,7 +901,254 @@ class LearningLog(models.Model):
         related_name='learning_log'
     )
     card = models.ForeignKey(Card, on_delete=models.SET_NULL, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Old logs are archived oldest first, see cards.retention
+            models.Index(
+                fields=['created_at', 'id'],
+                name='learninglog_created_at_idx'
+            ),
+        ]
+
+
+class LearningDayManager(models.Manager):
+    """
+    The counts are upserted with ON CONFLICT, like the rest of the
+    answer path this needs PostgreSQL
+    """
+    def track(self, user_id, dates):
+        """
+        Count new learning logs of the user, one date per log
+        """
+        counts = Counter(dates)
+        if not counts:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self._add_sql(
+                    'SELECT %(user)s, day, count FROM unnest('
+                    '%(days)s::date[], %(counts)s::integer[]'
+                    ') AS counts (day, count)'
+                ),
+                {
+                    'user': user_id,
+                    'days': list(counts),
+                    'counts': list(counts.values()),
+                }
+            )
+
+    def _add_sql(self, counts):
+        """
+        Statement adding the counts query of (user_id, date, count) rows
+        to the days, shared with CardProgress.answer
+        """
+        table = self.model._meta.db_table
+        return f"""
+            INSERT INTO {table} (user_id, date, count) {counts}
+            ON CONFLICT (user_id, date)
+            DO UPDATE SET count = {table}.count + EXCLUDED.count
+        """
+
+    def window(self, user, days):
+        """
+        Logs count of the user for each of the last days, oldest first
+        """
+        end_date = timezone.now().date()
+        start_date = end_date - timedelta(days=days - 1)
+        counts = dict(
+            self.filter(
+                user=user,
+                date__gte=start_date,
+                date__lte=end_date
+            ).values_list('date', 'count')
+        )
+        return {
+            start_date + timedelta(days=x): counts.get(
+                start_date + timedelta(days=x), 0
+            )
+            for x in range(days)
+        }
+
+
+class LearningDay(models.Model):
+    """
+    Number of learning logs of the user per day, kept in sync by
+    CardProgress.store_log and rebuilt by backfill_learning_days
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='learning_days'
+    )
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    objects = LearningDayManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                name='unique_learning_day'
+            ),
+        ]
+
+
+class LearnTodayManager(models.Manager):
+    """
+    Today's cards_total and cards_left per user and deck. They are
+    counted once a day when the row is created and then kept up to date
+    with every answer, reads come from the cache.
+    """
+    CACHE_TIMEOUT = 60 * 60 * 24
+
+    def _cache_key(self, user_id, deck_id, date, counter):
+        return f'cards:learn_today:{user_id}:{deck_id}:{date}:{counter}'
+
+    def counters(self, user, deck):
+        """
+        (cards_total, cards_left) for today
+        """
+        date = timezone.now().date()
+        total_key = self._cache_key(user.id, deck.id, date, 'total')
+        left_key = self._cache_key(user.id, deck.id, date, 'left')
+        cached = cache.get_many([total_key, left_key])
+        if len(cached) == 2:
+            return cached[total_key], cached[left_key]
+
+        obj, _ = self.get_or_create(user=user, deck=deck, date=date)
+        self._cache_counters([obj])
+        return obj.cards_total, obj.cards_left
+
+    def _cache_counters(self, rows):
+        counters = {}
+        for row in rows:
+            counters.update({
+                self._cache_key(row.user_id, row.deck_id, row.date, 'total'):
+                    row.cards_total,
+                self._cache_key(row.user_id, row.deck_id, row.date, 'left'):
+                    row.cards_left,
+            })
+        cache.set_many(counters, self.CACHE_TIMEOUT)
+
+    def roll_over(self, active_days=7, chunk_size=1000):
+        """
+        Create today's rows of the decks learned during the last
+        active_days in bulk and warm their counters into the cache.
+        Returns the (user_id, deck_id) pairs rolled over.
+        """
+        today = timezone.now().date()
+        learning_decks = LearningDeck.objects.filter(
+            models.Exists(self.filter(
+                user=models.OuterRef('user'),
+                deck=models.OuterRef('deck'),
+                date__gte=today - timedelta(days=active_days),
+                date__lt=today
+            ))
+        ).order_by('id').values_list('user_id', 'deck_id')
+
+        rolled_over = []
+        for offset in range(0, learning_decks.count(), chunk_size):
+            chunk = list(learning_decks[offset:offset + chunk_size])
+            pairs = set(chunk)
+            due = CardProgress.objects.filter(
+                due=today,
+                user_id__in={user_id for user_id, _ in pairs},
+                deck_id__in={deck_id for _, deck_id in pairs}
+            ).values('user', 'deck').annotate(
+                count=models.Count('id')
+            ).values_list('user', 'deck', 'count')
+            counts = {
+                (user_id, deck_id): count for user_id, deck_id, count in due
+            }
+
+            rows = [
+                self.model(
+                    user_id=user_id,
+                    deck_id=deck_id,
+                    cards_total=counts.get((user_id, deck_id), 0),
+                    cards_left=counts.get((user_id, deck_id), 0)
+                )
+                for user_id, deck_id in chunk
+            ]
+            self.bulk_create(rows, ignore_conflicts=True)
+
+            self._cache_counters(
+                row for row in self.filter(
+                    date=today,
+                    user_id__in={user_id for user_id, _ in pairs},
+                    deck_id__in={deck_id for _, deck_id in pairs}
+                )
+                if (row.user_id, row.deck_id) in pairs
+            )
+            rolled_over += pairs
+        return rolled_over
+
+    def track(self, user_id, deck_id, delta):
+        """
+        Move cards_left by delta after answers
+        """
+        if not delta:
+            return
+        date = timezone.now().date()
+        with connection.cursor() as cursor:
+            cursor.execute(self._track_sql(), {
+                'user': user_id,
+                'deck': deck_id,
+                'today': date,
+                'left_delta': delta,
+            })
+        # The cached value may be gone, the next read reloads it
+        cache.delete(self._cache_key(user_id, deck_id, date, 'left'))
+
+    def track_many(self, deltas):
+        """
+        Move cards_left of many decks by one statement, deltas maps
+        (user_id, deck_id) pairs to their change
+        """
+        deltas = {pair: delta for pair, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        today = timezone.now().date()
+        values = ', '.join(['(%s, %s, %s)'] * len(deltas))
+        params = [
+            value
+            for (user_id, deck_id), delta in deltas.items()
+            for value in (user_id, deck_id, delta)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {self.model._meta.db_table} AS learn_today
+                SET cards_left = GREATEST(
+                    learn_today.cards_left + deltas.delta, 0
+                )
+                FROM (VALUES {values}) AS deltas (user_id, deck_id, delta)
+                WHERE learn_today.user_id = deltas.user_id
+                    AND learn_today.deck_id = deltas.deck_id
+                    AND learn_today.date = %s
+                """,
+                [*params, today]
+            )
+        cache.delete_many([
+            self._cache_key(user_id, deck_id, today, 'left')
+            for user_id, deck_id in deltas
+        ])
+
+    def _track_sql(self, condition='TRUE'):
+        """
+        Statement moving cards_left of the %(user)s and %(deck)s row of
+        %(today)s by %(left_delta)s when condition holds, shared with
+        CardProgress.answer
+        """
+        return f"""
+            UPDATE {self.model._meta.db_table}
+            SET cards_left = GREATEST(cards_left + %(left_delta)s, 0)
+            WHERE user_id = %(user)s AND deck_id = %(deck)s
+                AND date = %(today)s AND {condition}
+            RETURNING user_id, deck_id, date, cards_total, cards_left
+        """
 
 
 class LearnToday(models.Model):
@@ -217,12 +1159,59 @@ class LearnToday(models.Model):
     )
     deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name='learn_today')
     cards_total = models.PositiveIntegerField(default=0)
+    cards_left = models.PositiveIntegerField(default=0)
     date = models.DateField(auto_now_add=True)
+    objects = LearnTodayManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'deck', 'date'],
+                name='unique_learn_today'
+            ),
+        ]
 
     def save(self, *args, **kwargs) -> None:
-        cards_total = CardProgress.objects.filter(
-            card__deck=self.deck,
-            due=self.date
-        ).count()
-        self.cards_total = cards_total
+        if self._state.adding:
+            cards_total = CardProgress.objects.words_left(self.user, self.deck)
+            self.cards_total = cards_total
+            self.cards_left = cards_total
         return super().save(*args, **kwargs)
+
+    @staticmethod
+    def left_delta(old_due, new_due):
+        """
+        How an answer moving a card from old_due to new_due changes
+        the number of cards left for today
+        """
+        today = timezone.now().date()
+        return (new_due == today) - (old_due == today)
+
+
+class LearningDeck(models.Model):
+    """
+    Deck the user learns. Cards without a CardProgress row are new
+    cards due since date.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='learning_decks'
+    )
+    deck = models.ForeignKey(
+        Deck,
+        on_delete=models.CASCADE,
+        related_name='learning_decks'
+    )
+    date = models.DateField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'deck'],
+                name='unique_learning_deck'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} learns {self.deck.title}'
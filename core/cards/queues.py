@@ -0,0 +1,131 @@
+"""
+Optional Redis backed due queues. Every (user, deck) pair learned
+through the queue has two sorted sets of card ids scored by
+(due, priority): reviews holds cards with priority 1, failed the cards
+answered wrong that wait in today's queue. Queues are filled from the
+database on the first read, kept up to date on every answer and rebuilt
+periodically by reconcile. Enabled by settings.CARDS_DUE_QUEUE_URL.
+"""
+import redis
+from django.conf import settings
+
+REVIEWS = 'reviews'
+FAILED = 'failed'
+# Priorities above this share the last slot of the day
+PRIORITY_SLOTS = 1000
+WARM_TIMEOUT = 60 * 60 * 24
+WARM_KEY = 'cards:due_queue:warm'
+
+_queues = {}
+
+
+def score(due, priority):
+    return due.toordinal() * PRIORITY_SLOTS + min(priority, PRIORITY_SLOTS - 1)
+
+
+def kind(priority):
+    return REVIEWS if priority <= 1 else FAILED
+
+
+class DueQueue:
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, user_id, deck_id, kind):
+        return f'cards:due_queue:{user_id}:{deck_id}:{kind}'
+
+    def _warm_key(self, user_id, deck_id):
+        return self._key(user_id, deck_id, 'warm')
+
+    def is_warm(self, user_id, deck_id):
+        return bool(self.client.exists(self._warm_key(user_id, deck_id)))
+
+    def first(self, user_id, deck_id, kind, today):
+        """
+        Id of the first card of kind due until today, or None
+        """
+        card_ids = self.client.zrangebyscore(
+            self._key(user_id, deck_id, kind),
+            '-inf',
+            score(today, PRIORITY_SLOTS),
+            start=0,
+            num=1
+        )
+        return int(card_ids[0]) if card_ids else None
+
+    def fill(self, user_id, deck_id, rows):
+        """
+        Replace the queue with rows of (card_id, due, priority)
+        """
+        queued = {REVIEWS: {}, FAILED: {}}
+        for card_id, due, priority in rows:
+            queued[kind(priority)][card_id] = score(due, priority)
+
+        pipe = self.client.pipeline(transaction=True)
+        for queue_kind, mapping in queued.items():
+            key = self._key(user_id, deck_id, queue_kind)
+            pipe.delete(key)
+            if mapping:
+                pipe.zadd(key, mapping)
+        pipe.set(self._warm_key(user_id, deck_id), 1, ex=WARM_TIMEOUT)
+        pipe.sadd(WARM_KEY, f'{user_id}:{deck_id}')
+        pipe.execute()
+
+    def update(self, progresses):
+        """
+        Write answered progress through to the warm queues
+        """
+        progresses = list(progresses)
+        pairs = {(p.user_id, p.deck_id) for p in progresses}
+        warm = {pair for pair in pairs if self.is_warm(*pair)}
+
+        pipe = self.client.pipeline(transaction=False)
+        for progress in progresses:
+            pair = (progress.user_id, progress.deck_id)
+            if pair not in warm:
+                continue
+            for queue_kind in (REVIEWS, FAILED):
+                pipe.zrem(self._key(*pair, queue_kind), progress.card_id)
+            pipe.zadd(
+                self._key(*pair, kind(progress.priority)),
+                {progress.card_id: score(progress.due, progress.priority)}
+            )
+        pipe.execute()
+
+    def discard(self, user_id, deck_id, card_id):
+        for queue_kind in (REVIEWS, FAILED):
+            self.client.zrem(self._key(user_id, deck_id, queue_kind), card_id)
+
+    def invalidate(self, pairs):
+        """
+        Make the queues cold, they are filled again on the next read
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return
+        self.client.delete(*(
+            self._key(user_id, deck_id, queue_kind)
+            for user_id, deck_id in pairs
+            for queue_kind in (REVIEWS, FAILED, 'warm')
+        ))
+        self.client.srem(WARM_KEY, *(
+            f'{user_id}:{deck_id}' for user_id, deck_id in pairs
+        ))
+
+    def warm_pairs(self):
+        return [
+            tuple(int(part) for part in member.split(b':'))
+            for member in self.client.smembers(WARM_KEY)
+        ]
+
+
+def get_due_queue():
+    """
+    DueQueue of settings.CARDS_DUE_QUEUE_URL, None when disabled
+    """
+    url = getattr(settings, 'CARDS_DUE_QUEUE_URL', None)
+    if not url:
+        return None
+    if url not in _queues:
+        _queues[url] = DueQueue(redis.Redis.from_url(url))
+    return _queues[url]
@@ -0,0 +1,98 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from cards.models import LearningDay, LearningLog
+
+BATCH_SIZE = 5000
+
+
+def retention_horizon(days=None):
+    """
+    Learning logs created before the horizon are archived
+    """
+    if days is None:
+        days = settings.LEARNING_LOG_RETENTION_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def _rollup(rows):
+    """
+    Store the daily counts of the users and dates in rows when they
+    are not counted yet. Days already in LearningDay are kept as they
+    are, so the rollup is safe to repeat on a partly deleted day.
+    """
+    pairs = {(row['user_id'], row['created_at'].date()) for row in rows}
+    log_data = (
+        LearningLog.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            created_at__date__in={date for _, date in pairs}
+        )
+        .annotate(date=TruncDate('created_at'))
+        .values('user_id', 'date')
+        .annotate(count=Count('id'))
+    )
+    LearningDay.objects.bulk_create(
+        [
+            LearningDay(
+                user_id=data['user_id'], date=data['date'], count=data['count']
+            )
+            for data in log_data
+            if (data['user_id'], data['date']) in pairs
+        ],
+        ignore_conflicts=True
+    )
+
+
+def _write_archive(rows, archive_dir):
+    """
+    Write rows to a gzip compressed JSON lines file named after their
+    id range, writing the same batch again replaces the file
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(
+        archive_dir,
+        f'learning_log-{rows[0]["id"]:012d}-{rows[-1]["id"]:012d}.jsonl.gz'
+    )
+    tmp_path = f'{path}.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+        for row in rows:
+            archive.write(json.dumps({
+                **row, 'created_at': row['created_at'].isoformat()
+            }))
+            archive.write('\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_learning_log(before=None, archive_dir=None, batch_size=BATCH_SIZE):
+    """
+    Roll up, archive and delete learning logs created before the
+    horizon, batch_size rows at a time. Every batch is written to its
+    own file before it is deleted, an interrupted run can be repeated.
+    Returns the number of archived rows.
+    """
+    before = before or retention_horizon()
+    archive_dir = archive_dir or settings.LEARNING_LOG_ARCHIVE_DIR
+    logs = (
+        LearningLog.objects.filter(created_at__lt=before)
+        .order_by('created_at', 'id')
+        .values('id', 'user_id', 'card_id', 'created_at')
+    )
+
+    archived = 0
+    while True:
+        rows = sorted(logs[:batch_size], key=lambda row: row['id'])
+        if not rows:
+            return archived
+
+        _rollup(rows)
+        _write_archive(rows, archive_dir)
+        LearningLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
@@ -0,0 +1,211 @@
+"""
+Spaced repetition scheduling without side effects. schedule() works on
+plain values so progress can be rescheduled in memory, CardProgress
+applies the result and performs the intents. Alternative algorithms
+are registered in SCHEDULERS, settings.CARDS_SCHEDULER picks one.
+"""
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+NEW = 0
+LEARNING = 1
+REVIEW = 2
+RELEARNING = 3
+
+ACTIONS = ('again', 'hard', 'good')
+MIN_EASE = Decimal('1.05')
+
+LEARNING_EASE = 2
+REVIEW_DAYS = 6
+
+# ease change, priority change and interval per action
+STEPS = {
+    'again': (Decimal('-0.25'), 1),
+    'hard': (Decimal('-0.15'), 2),
+    'good': (Decimal('0.15'), 3),
+}
+GOOD_INTERVALS = {LEARNING: 2, REVIEW: 3}
+GOOD_REVIEW_EASE = Decimal('0.25')
+
+# New state of a card. log is True when the card leaves today's queue
+# and the answer has to be logged, save when the state has changed.
+Transition = namedtuple(
+    'Transition', ['stage', 'ease', 'priority', 'due', 'log', 'save']
+)
+
+
+def schedule(stage, ease, priority, action, today, due=None):
+    """
+    Next state of a card answered with action on today
+    """
+    if action not in STEPS:
+        raise ValueError(f"Invalid action: {action}")
+    if not isinstance(ease, Decimal):
+        ease = Decimal(str(ease))
+
+    ease_step, priority_step = STEPS[action]
+    if action == 'good':
+        interval = GOOD_INTERVALS.get(stage, 1)
+        if stage == REVIEW:
+            ease_step = GOOD_REVIEW_EASE
+        new_ease = ease + ease_step
+    else:
+        interval = 0
+        new_ease = max(ease + ease_step, MIN_EASE)
+
+    new_stage = stage
+    if new_stage == NEW and new_ease > LEARNING_EASE:
+        new_stage = LEARNING
+        interval = 1
+    if new_stage == LEARNING and interval * new_ease > REVIEW_DAYS:
+        new_stage = REVIEW
+
+    new_due = today + timedelta(days=int(interval * new_ease))
+    graduated = new_due > today
+    new_priority = 1 if graduated else priority + priority_step
+
+    return Transition(
+        stage=new_stage,
+        ease=new_ease,
+        priority=new_priority,
+        due=new_due,
+        log=graduated,
+        save=(new_stage, new_ease, new_priority, new_due)
+        != (stage, ease, priority, due)
+    )
+
+
+class Scheduler(ABC):
+    """
+    Scheduling algorithm. schedule() answers a single card, the array
+    methods convert stored states between algorithms for rescheduling:
+    stability is the interval in days a card in the state is given.
+    A subclass missing any of them cannot be instantiated, so it fails
+    when it is registered in SCHEDULERS.
+    """
+    name = None
+
+    @abstractmethod
+    def schedule(self, stage, ease, priority, action, today, due=None):
+        pass
+
+    @abstractmethod
+    def stability(self, stage, ease):
+        pass
+
+    @abstractmethod
+    def ease_for(self, stage, stability):
+        pass
+
+    def interval(self, stage, ease):
+        return np.floor(self.stability(stage, ease)).astype(np.int64)
+
+
+class SM2Scheduler(Scheduler):
+    """
+    The original rules, ease is a multiplier of the stage interval
+    """
+    name = 'sm2'
+    _stage_intervals = np.array([
+        GOOD_INTERVALS.get(stage, 1)
+        for stage in (NEW, LEARNING, REVIEW, RELEARNING)
+    ])
+
+    def schedule(self, stage, ease, priority, action, today, due=None):
+        return schedule(stage, ease, priority, action, today, due=due)
+
+    def stability(self, stage, ease):
+        return self._stage_intervals[stage] * ease
+
+    def ease_for(self, stage, stability):
+        return np.maximum(
+            stability / self._stage_intervals[stage], float(MIN_EASE)
+        )
+
+
+class FSRSScheduler(Scheduler):
+    """
+    Simplified FSRS: ease holds the memory stability in days, the
+    interval keeps recall probability at RETENTION. Again and hard
+    keep the card in today's queue like the original rules.
+    """
+    name = 'fsrs'
+    RETENTION = 0.9
+    INITIAL_STABILITY = {'again': 0.4, 'hard': 1.2, 'good': 3.2}
+    AGAIN_FACTOR = 0.5
+    HARD_FACTOR = 0.85
+    GROWTH = 2.0
+    DECAY = 0.3
+    MIN_STABILITY = 0.1
+    MAX_STABILITY = 999.99
+
+    def schedule(self, stage, ease, priority, action, today, due=None):
+        if action not in STEPS:
+            raise ValueError(f"Invalid action: {action}")
+        stability = float(ease)
+        if stage == NEW:
+            stability = self.INITIAL_STABILITY[action]
+        elif action == 'again':
+            stability *= self.AGAIN_FACTOR
+        elif action == 'hard':
+            stability *= self.HARD_FACTOR
+        else:
+            stability *= 1 + self.GROWTH * stability ** -self.DECAY
+        stability = min(max(stability, self.MIN_STABILITY), self.MAX_STABILITY)
+        new_ease = Decimal(str(round(stability, 2)))
+
+        interval = 0
+        new_stage = stage
+        if action == 'good':
+            interval = max(1, int(self.interval(stage, stability)))
+            if stage != REVIEW:
+                new_stage = REVIEW if interval > REVIEW_DAYS else LEARNING
+        elif stage == REVIEW and action == 'again':
+            new_stage = RELEARNING
+        elif stage == NEW:
+            new_stage = LEARNING
+
+        new_due = today + timedelta(days=interval)
+        graduated = new_due > today
+        new_priority = 1 if graduated else priority + STEPS[action][1]
+        return Transition(
+            stage=new_stage,
+            ease=new_ease,
+            priority=new_priority,
+            due=new_due,
+            log=graduated,
+            save=(new_stage, new_ease, new_priority, new_due)
+            != (stage, ease, priority, due)
+        )
+
+    def stability(self, stage, ease):
+        return ease * 9 * (1 / self.RETENTION - 1)
+
+    def ease_for(self, stage, stability):
+        return np.clip(
+            stability / (9 * (1 / self.RETENTION - 1)),
+            self.MIN_STABILITY,
+            self.MAX_STABILITY
+        )
+
+
+SCHEDULERS = {
+    scheduler.name: scheduler
+    for scheduler in (SM2Scheduler(), FSRSScheduler())
+}
+
+
+def get_scheduler(name=None):
+    """
+    Scheduler by name, settings.CARDS_SCHEDULER by default
+    """
+    name = name or getattr(settings, 'CARDS_SCHEDULER', SM2Scheduler.name)
+    try:
+        return SCHEDULERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown scheduler: {name}")
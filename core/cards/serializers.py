@@ -3,7 +3,9 @@ import random
 from django.utils import timezone
 from rest_framework import serializers
 
+from cards.cache import get_answer_pool
 from cards.models import Card, CardProgress, Deck, LearningLog
+from core import identity_map
 from core.fields import Base64ImageField
 
 
@@ -50,51 +52,80 @@ class CardDetailSerializer(CardSerializer):
 
 
 class LearnCardSerializer(CardDetailSerializer):
+    """
+    Card with quiz answers and today's counters.
+    Callers serializing many cards pass words_left in the context
+    so it is computed once for the whole batch.
+    """
     def to_representation(self, instance):
         user = self.context.get('user')
-        date = timezone.now().date()
-        deck = instance.deck
-
-        words_left = CardProgress.objects.filter(
-            card__deck=deck,
-            user=user,
-            due=date
-        ).count()
+
+        words_left = self.context.get('words_left')
+        if words_left is None:
+            deck = identity_map.get(Deck, instance.deck_id)
+            words_left = CardProgress.objects.words_left(user, deck)
         words_total = self.context.get('cards_total', 0)
 
         context = super().to_representation(instance)
-        context['answers'] = self._get_random_answers(3)
+        context['answers'] = self._get_random_answers(instance, 3)
         context['words_total'] = words_total
         context['words_left'] = words_left
 
         return context
 
-    def _get_random_answers(self, ans_count: int) -> list:
+    def _get_random_answers(self, card: Card, ans_count: int) -> list:
         """
-        Get answers for a quiz with ans_count wrong answers
+        Get answers for a quiz with ans_count wrong answers.
+        Wrong answers come from the card's precomputed distractors,
+        cards that are not indexed yet use random deck translations.
         """
-        answers = [self.instance.translation]
-        count = Card.objects.filter(
-            deck=self.instance.deck
-        ).count()
-
-        if ans_count >= count:
-            cards = Card.objects.filter(deck=self.instance.deck)
-            answers = [card.translation for card in cards]
-        else:
-            while len(answers) < ans_count:
-                random_index = random.randint(0, count - 1)
-                answer = Card.objects.filter(
-                    deck=self.instance.deck
-                )[random_index].translation
-
-                if answer not in answers:
-                    answers.append(answer)
-
+        wrong = [
+            translation for translation in card.distractors
+            if translation != card.translation
+        ]
+        if len(wrong) < ans_count - 1:
+            wrong = [
+                translation for translation in get_answer_pool(card.deck_id)
+                if translation != card.translation
+            ]
+        answers = [card.translation] + random.sample(
+            wrong,
+            min(ans_count - 1, len(wrong))
+        )
         random.shuffle(answers)
         return answers
 
 
+class LearnAnswerSerializer(serializers.Serializer):
+    card_id = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=CardProgress.ACTIONS)
+    answered_at = serializers.DateTimeField(
+        required=False,
+        default_timezone=timezone.get_default_timezone()
+    )
+
+    def validate_answered_at(self, answered_at):
+        # Times are stored naive in TIME_ZONE, an offset sent by the client
+        # must not move the answer to another day
+        answered_at = timezone.make_naive(answered_at)
+        # Clients with a skewed clock must not schedule cards from the future
+        return min(answered_at, timezone.now())
+
+
+class LearnBatchSerializer(serializers.Serializer):
+    MAX_ANSWERS = 500
+
+    answers = LearnAnswerSerializer(many=True, allow_empty=False)
+
+    def validate_answers(self, answers):
+        if len(answers) > self.MAX_ANSWERS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than '
+                f'{self.MAX_ANSWERS} elements.'
+            )
+        return answers
+
+
 class DeckSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=False)
 
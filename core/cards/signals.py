@@ -1,37 +1,173 @@
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.db.models.signals import post_delete, post_save
 from django.db import transaction
 from django.dispatch import receiver
 from django.conf import settings
 
-from .tasks import generate_hashed_images, set_additional_images_task
+from core.storage import release_on_commit
+from .cache import invalidate_answer_pool, update_card_id
+from .tasks import (
+    generate_hashed_images,
+    set_additional_images_task,
+    update_distractor_index
+)
 from .models import Card, Deck, CardAdditionalImage
 
 
-def generate_hash(created, model_name, instance):
-    if created:
-        transaction.on_commit(
-            lambda: generate_hashed_images.delay(model_name, instance.pk)
-        )
-    else:
-        generate_hashed_images.delay(model_name, instance.id)
+def _pending_on_commit(key):
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+    return next(
+        (
+            callback for _, callback, _ in connection.run_on_commit
+            if getattr(callback, 'task_key', None) == key
+        ),
+        None
+    )
+
+
+def enqueue_on_commit(task, *args):
+    """
+    Send the task once the transaction commits. A task already waiting
+    for the commit with the same arguments is not sent again.
+    """
+    key = (task.name, args)
+    if _pending_on_commit(key) is not None:
+        return
+
+    callback = partial(task.delay, *args)
+    callback.task_key = key
+    transaction.on_commit(callback)
+
+
+def generate_hash(model_name, instance):
+    if instance.image and 'image' in instance.changed_fields():
+        enqueue_on_commit(generate_hashed_images, model_name, instance.pk)
 
 
 @receiver(post_save, sender=Card)
 def set_card_images(sender, instance, created, **kwargs):
-    api_key = settings.PIXABAY_API_KEY
-    generate_hash(created, 'cards.Card', instance)
+    generate_hash('cards.Card', instance)
 
-    if created:
-        set_additional_images_task.delay(instance.id, api_key)
-    else:
-        set_additional_images_task.delay(instance.id, api_key)
+    # Additional images are searched by the word
+    if 'word' in instance.changed_fields():
+        enqueue_on_commit(
+            set_additional_images_task,
+            instance.id,
+            settings.PIXABAY_API_KEY
+        )
 
 
 @receiver(post_save, sender=Deck)
 def set_deck_images(sender, instance, created, **kwargs):
-    generate_hash(created, 'cards.Deck', instance)
+    generate_hash('cards.Deck', instance)
 
 
 @receiver(post_save, sender=CardAdditionalImage)
 def set_card_additional_images(sender, instance, created, **kwargs):
-    generate_hash(created, 'cards.CardAdditionalImage', instance)
+    generate_hash('cards.CardAdditionalImage', instance)
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def update_answer_pool(sender, instance, **kwargs):
+    invalidate_answer_pool(instance.deck_id)
+    previous_deck_id = instance.loaded_value('deck')
+    if previous_deck_id and previous_deck_id != instance.deck_id:
+        invalidate_answer_pool(previous_deck_id)
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def update_card_ids(sender, instance, created=None, **kwargs):
+    # created is None for deletes, other saves only matter when the
+    # card moves or its image comes or goes
+    if created is None:
+        old, new = (instance.deck_id, bool(instance.image)), None
+    elif created:
+        old, new = None, (instance.deck_id, bool(instance.image))
+    elif {'deck', 'image'} & instance.changed_fields():
+        old = (
+            instance.loaded_value('deck'),
+            bool(instance.loaded_value('image'))
+        )
+        new = (instance.deck_id, bool(instance.image))
+    else:
+        return
+    transaction.on_commit(partial(update_card_id, instance.pk, old, new))
+
+
+def _send_distractor_update(deck_id, changes):
+    if not changes['deleted']:
+        update_distractor_index.delay(
+            deck_id, sorted(changes['card_ids']), sorted(changes['removed'])
+        )
+
+
+def enqueue_distractor_update(deck_id, card_ids=(), removed=()):
+    """
+    Refresh the deck's distractors once the transaction commits. All
+    changes to a deck within one transaction share a single task.
+    """
+    key = (update_distractor_index.name, deck_id)
+    pending = _pending_on_commit(key)
+    changes = (
+        pending.args[1] if pending is not None
+        else {'card_ids': set(), 'removed': set(), 'deleted': False}
+    )
+    changes['card_ids'].update(card_ids)
+    changes['removed'].update(removed)
+    if pending is None:
+        callback = partial(_send_distractor_update, deck_id, changes)
+        callback.task_key = key
+        transaction.on_commit(callback)
+
+
+@receiver(post_save, sender=Card)
+def update_card_distractors(sender, instance, created, **kwargs):
+    previous_deck_id = instance.loaded_value('deck')
+    previous_translation = instance.loaded_value('translation')
+    changed = instance.changed_fields()
+    moved = not created and 'deck' in changed
+    renamed = not created and 'translation' in changed
+    if not (created or moved or renamed):
+        return
+
+    removed = [previous_translation] if renamed and not moved else []
+    enqueue_distractor_update(instance.deck_id, [instance.id], removed)
+    if moved and previous_deck_id:
+        enqueue_distractor_update(previous_deck_id, [], [previous_translation])
+
+
+@receiver(post_delete, sender=Card)
+def remove_card_distractors(sender, instance, **kwargs):
+    enqueue_distractor_update(instance.deck_id, [], [instance.translation])
+
+
+@receiver(post_delete, sender=Deck)
+def drop_deck_distractors(sender, instance, **kwargs):
+    # Cards deleted along with their deck leave nothing to refresh
+    callback = _pending_on_commit((update_distractor_index.name, instance.pk))
+    if callback is not None:
+        callback.args[1]['deleted'] = True
+
+
+@receiver(post_save, sender=Deck)
+@receiver(post_save, sender=Card)
+@receiver(post_save, sender=CardAdditionalImage)
+def release_replaced_image(sender, instance, **kwargs):
+    previous = instance.loaded_value('image')
+    if previous and 'image' in instance.changed_fields():
+        release_on_commit(instance.image.storage, previous)
+
+
+@receiver(post_delete, sender=Deck)
+@receiver(post_delete, sender=Card)
+@receiver(post_delete, sender=CardAdditionalImage)
+def release_image(sender, instance, **kwargs):
+    # Files are shared by content, the storage removes one only when its
+    # last reference goes
+    if instance.image:
+        release_on_commit(instance.image.storage, instance.image.name)
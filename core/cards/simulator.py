@@ -0,0 +1,155 @@
+"""
+Replays the cards.scheduling rules over arrays of cards to predict the
+daily load. Ease is kept in hundredths as integers so the intervals
+match the Decimal arithmetic of schedule() exactly.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from cards import scheduling
+
+AGAIN, HARD, GOOD = range(3)
+
+# Probability of again, hard and good per stage
+DEFAULT_ANSWERS = {
+    scheduling.NEW: (0.2, 0.2, 0.6),
+    scheduling.LEARNING: (0.1, 0.2, 0.7),
+    scheduling.REVIEW: (0.05, 0.15, 0.8),
+    scheduling.RELEARNING: (0.1, 0.2, 0.7),
+}
+
+# Tunable parts of the rules, ease values in hundredths
+Rules = namedtuple(
+    'Rules',
+    ['default_ease', 'min_ease', 'ease_steps', 'good_review_ease']
+)
+
+Simulation = namedtuple(
+    'Simulation',
+    [
+        # cards due at the start of each day, overdue ones included
+        'due',
+        # answers given each day
+        'reviews',
+        # due cards left unanswered at the end of each day
+        'backlog',
+        # days from the first answer to the review stage, -1 if never
+        'review_days',
+    ]
+)
+
+
+def _hundredths(value):
+    return int(round(float(value) * 100))
+
+
+def default_rules():
+    return Rules(
+        default_ease=_hundredths(scheduling.MIN_EASE),
+        min_ease=_hundredths(scheduling.MIN_EASE),
+        ease_steps=tuple(
+            _hundredths(scheduling.STEPS[action][0])
+            for action in scheduling.ACTIONS
+        ),
+        good_review_ease=_hundredths(scheduling.GOOD_REVIEW_EASE),
+    )
+
+
+def _cumulative(answers):
+    table = np.array(
+        [answers[stage] for stage in sorted(DEFAULT_ANSWERS)],
+        dtype=np.float64
+    )
+    table /= table.sum(axis=1, keepdims=True)
+    return np.cumsum(table, axis=1)[:, :2]
+
+
+def transition(stage, ease, actions, rules):
+    """
+    Vectorized schedule(): new stages, eases and intervals in days
+    for cards answered with actions
+    """
+    good = actions == GOOD
+    steps = np.asarray(rules.ease_steps, dtype=np.int32)[actions]
+    steps = np.where(
+        good & (stage == scheduling.REVIEW), rules.good_review_ease, steps
+    )
+    new_ease = ease + steps
+    new_ease = np.where(good, new_ease, np.maximum(new_ease, rules.min_ease))
+
+    interval = np.zeros_like(ease)
+    interval[good] = 1
+    for good_stage, good_interval in scheduling.GOOD_INTERVALS.items():
+        interval[good & (stage == good_stage)] = good_interval
+
+    new_stage = stage.copy()
+    learning = (
+        (new_stage == scheduling.NEW)
+        & (new_ease > scheduling.LEARNING_EASE * 100)
+    )
+    new_stage[learning] = scheduling.LEARNING
+    interval[learning] = 1
+    review = (
+        (new_stage == scheduling.LEARNING)
+        & (interval * new_ease > scheduling.REVIEW_DAYS * 100)
+    )
+    new_stage[review] = scheduling.REVIEW
+
+    return new_stage, new_ease, interval * new_ease // 100
+
+
+def simulate(cards, days, answers=None, rules=None, new_per_day=0,
+             max_cards=0, seed=None):
+    """
+    Learn cards for days. New cards are due new_per_day a day, all of
+    them on the first day by default. At most max_cards due cards are
+    learned a day, the most overdue first, the rest is the backlog.
+    A card is answered until it leaves the day's queue, as in the app.
+    """
+    rules = rules or default_rules()
+    cumulative = _cumulative(answers or DEFAULT_ANSWERS)
+    rng = np.random.default_rng(seed)
+
+    stage = np.full(cards, scheduling.NEW, dtype=np.int8)
+    ease = np.full(cards, rules.default_ease, dtype=np.int32)
+    if new_per_day:
+        due = np.arange(cards, dtype=np.int32) // new_per_day
+    else:
+        due = np.zeros(cards, dtype=np.int32)
+    first_day = np.full(cards, -1, dtype=np.int32)
+    review_day = np.full(cards, -1, dtype=np.int32)
+
+    result = Simulation(
+        due=np.zeros(days, dtype=np.int64),
+        reviews=np.zeros(days, dtype=np.int64),
+        backlog=np.zeros(days, dtype=np.int64),
+        review_days=None,
+    )
+    for day in range(days):
+        queue = np.flatnonzero(due <= day)
+        result.due[day] = len(queue)
+        if max_cards and len(queue) > max_cards:
+            queue = queue[np.argsort(due[queue], kind='stable')[:max_cards]]
+        result.backlog[day] = result.due[day] - len(queue)
+        first_day[queue[first_day[queue] < 0]] = day
+
+        while len(queue):
+            actions = (
+                rng.random(len(queue))[:, None]
+                > cumulative[stage[queue]]
+            ).sum(axis=1)
+            new_stage, ease[queue], interval = transition(
+                stage[queue], ease[queue], actions, rules
+            )
+            reached = queue[
+                (new_stage == scheduling.REVIEW) & (review_day[queue] < 0)
+            ]
+            review_day[reached] = day
+            stage[queue] = new_stage
+            due[queue] = day + interval
+            result.reviews[day] += len(queue)
+            queue = queue[interval == 0]
+
+    review_days = np.where(review_day >= 0, review_day - first_day, -1)
+    return result._replace(review_days=review_days)
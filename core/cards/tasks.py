@@ -1,10 +1,13 @@
-import blurhash
 
 from django.apps import apps
 
 from core.celery import app as celery_app
-from cards.utils import set_additional_images
-from cards.models import HashedImage
+from cards.utils import generate_hash_for_instance, set_additional_images
+from cards.distractors import update_deck_index
+from cards.retention import archive_learning_log
+from cards.cache import get_answer_pool
+from cards.models import CardProgress, LearnToday
+from cards.queues import get_due_queue
 
 
 @celery_app.task(name='cards.tasks.generate_hashed_images')
@@ -19,21 +22,45 @@ def generate_hashed_images(modelName, instance_id):
     if not instance.image:
         return
 
-    try:
-        with open(instance.image.path, 'rb') as image_file:
-            hash = blurhash.encode(image_file, x_components=4, y_components=3)
-            if instance.hashed_image:
-                hashed_image = instance.hashed_image
-                hashed_image.hash = hash
-                hashed_image.save()
-            else:
-                hashed_image = HashedImage.objects.create(hash=hash)
-                instance.hashed_image = hashed_image
-                instance.save()
-    except FileNotFoundError:
-        pass
+    generate_hash_for_instance(instance)
 
 
 @celery_app.task(name='cards.tasks.set_additional_images_task')
 def set_additional_images_task(card_id, api_key):
     set_additional_images(card_id, api_key)
+
+
+@celery_app.task(name='cards.tasks.update_distractor_index')
+def update_distractor_index(deck_id, card_ids=(), removed=()):
+    update_deck_index(deck_id, card_ids=card_ids, removed=removed)
+
+
+@celery_app.task(name='cards.tasks.archive_learning_log_task')
+def archive_learning_log_task():
+    archive_learning_log()
+
+
+@celery_app.task(name='cards.tasks.roll_over_learn_today')
+def roll_over_learn_today():
+    """
+    Nightly: prepare today's counters and answer pools of active learners
+    so their first request of the day does not compute them
+    """
+    pairs = LearnToday.objects.roll_over()
+    for deck_id in {deck_id for _, deck_id in pairs}:
+        get_answer_pool(deck_id)
+
+
+@celery_app.task(name='cards.tasks.reconcile_due_queues')
+def reconcile_due_queues():
+    """
+    Rebuild the warm due queues from the database, forget expired ones
+    """
+    queue = get_due_queue()
+    if queue is None:
+        return
+    for user_id, deck_id in queue.warm_pairs():
+        if queue.is_warm(user_id, deck_id):
+            CardProgress.objects.fill_queue(queue, user_id, deck_id)
+        else:
+            queue.invalidate([(user_id, deck_id)])
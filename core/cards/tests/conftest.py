@@ -1,8 +1,10 @@
 import pytest
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
 from cards.models import Card, Deck, CardAdditionalImage
-from cards.signals import (set_card_additional_images, set_card_images,
-                           set_deck_images)
+from cards.signals import (remove_card_distractors, set_card_additional_images,
+                           set_card_images, set_deck_images,
+                           update_card_distractors)
 
 
 @pytest.fixture(autouse=True)
@@ -13,7 +15,24 @@ def mute_signals():
     )
     post_save.disconnect(set_card_images, sender=Card)
     post_save.disconnect(set_deck_images, sender=Deck)
+    post_save.disconnect(update_card_distractors, sender=Card)
+    post_delete.disconnect(remove_card_distractors, sender=Card)
     yield
     post_save.connect(set_card_additional_images, sender=CardAdditionalImage)
     post_save.connect(set_card_images, sender=Card)
     post_save.connect(set_deck_images, sender=Deck)
+    post_save.connect(update_card_distractors, sender=Card)
+    post_delete.connect(remove_card_distractors, sender=Card)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    # Stored images and their reference counts stay out of the repository
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.MEDIA_REFS_ROOT = str(tmp_path / 'media_refs')
@@ -0,0 +1,119 @@
+import time
+
+
+def _bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class FakeRedis:
+    """
+    In-process stand-in for the part of redis.Redis the due queues use
+    """
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _get(self, name, default):
+        name = _bytes(name)
+        if name in self.expires and self.expires[name] <= time.time():
+            self.data.pop(name, None)
+            self.expires.pop(name)
+        return self.data.setdefault(name, default)
+
+    def _clean(self, name):
+        name = _bytes(name)
+        if not self.data.get(name):
+            self.data.pop(name, None)
+
+    def exists(self, *names):
+        count = 0
+        for name in names:
+            self._get(name, None)
+            self._clean(name)
+            count += _bytes(name) in self.data
+        return count
+
+    def set(self, name, value, ex=None):
+        self.data[_bytes(name)] = _bytes(value)
+        if ex:
+            self.expires[_bytes(name)] = time.time() + ex
+        return True
+
+    def delete(self, *names):
+        count = 0
+        for name in names:
+            count += self.data.pop(_bytes(name), None) is not None
+            self.expires.pop(_bytes(name), None)
+        return count
+
+    def zadd(self, name, mapping):
+        zset = self._get(name, {})
+        added = sum(_bytes(member) not in zset for member in mapping)
+        zset.update({
+            _bytes(member): score for member, score in mapping.items()
+        })
+        return added
+
+    def zrem(self, name, *members):
+        zset = self._get(name, {})
+        removed = sum(
+            zset.pop(_bytes(member), None) is not None for member in members
+        )
+        self._clean(name)
+        return removed
+
+    def zrangebyscore(self, name, min, max, start=None, num=None):
+        min = float(min)
+        max = float(max)
+        members = sorted(
+            (score, member)
+            for member, score in self._get(name, {}).items()
+            if min <= score <= max
+        )
+        self._clean(name)
+        members = [member for _, member in members]
+        if start is not None:
+            members = members[start:start + num]
+        return members
+
+    def sadd(self, name, *values):
+        members = self._get(name, set())
+        added = sum(_bytes(value) not in members for value in values)
+        members.update(_bytes(value) for value in values)
+        return added
+
+    def srem(self, name, *values):
+        members = self._get(name, set())
+        removed = sum(_bytes(value) in members for value in values)
+        members.difference_update(_bytes(value) for value in values)
+        self._clean(name)
+        return removed
+
+    def smembers(self, name):
+        members = set(self._get(name, set()))
+        self._clean(name)
+        return members
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return command
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [
+            getattr(self.client, name)(*args, **kwargs)
+            for name, args, kwargs in commands
+        ]
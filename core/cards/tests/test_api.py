@@ -1,12 +1,27 @@
 import json
 from collections import OrderedDict
-
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 
-from cards.models import Card, Deck
+from cards.cache import get_answer_pool, random_card_id
+from cards.models import (
+    Card, CardAdditionalImage, CardProgress, Deck, HashedImage, LearningDay,
+    LearningDeck, LearningLog, LearnToday
+)
 from cards.factories import CardFactory, DeckFactory
+from cards.serializers import LearnCardSerializer
+from cards.tasks import roll_over_learn_today
 from user.factories import UserFactory
 from .mixins import ExpectedResponseMixin
 
@@ -428,3 +443,632 @@ class TestDeck(APITestCase, ExpectedResponseMixin):
         )
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class TestLearnCards(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.deck = DeckFactory(user=self.user)
+        self.cards = CardFactory.create_batch(5, deck=self.deck)
+        self.deck.add_to_user(self.user)
+
+    def test_batch_not_authenticated(self):
+        response = self.client.post(
+            reverse(
+                'cards:learn_cards_batch', kwargs={'deck_id': self.deck.id}
+            ),
+            data={'answers': []},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_batch_invalid_action(self):
+        self.client.force_authenticate(self.user)
+        data = {'answers': [{'card_id': self.cards[0].id, 'action': 'easy'}]}
+        response = self.client.post(
+            reverse(
+                'cards:learn_cards_batch', kwargs={'deck_id': self.deck.id}
+            ),
+            data=data,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_unknown_card(self):
+        self.client.force_authenticate(self.user)
+        other_card = CardFactory()
+        data = {'answers': [{'card_id': other_card.id, 'action': 'good'}]}
+        response = self.client.post(
+            reverse(
+                'cards:learn_cards_batch', kwargs={'deck_id': self.deck.id}
+            ),
+            data=data,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_success(self):
+        """
+        Test answers are applied in order and graduated cards are logged
+        """
+        self.client.force_authenticate(self.user)
+        answered_at = timezone.now() - timedelta(days=1)
+        data = {
+            'answers': [
+                {'card_id': self.cards[0].id, 'action': 'again'},
+                {'card_id': self.cards[0].id, 'action': 'good'},
+                {
+                    'card_id': self.cards[1].id,
+                    'action': 'good',
+                    'answered_at': answered_at.isoformat()
+                },
+            ]
+        }
+        response = self.client.post(
+            reverse(
+                'cards:learn_cards_batch', kwargs={'deck_id': self.deck.id}
+            ),
+            data=data,
+            format='json'
+        )
+
+        first = CardProgress.objects.get(user=self.user, card=self.cards[0])
+        second = CardProgress.objects.get(user=self.user, card=self.cards[1])
+        logs = LearningLog.objects.filter(user=self.user).order_by('id')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(response.data['id'], [card.id for card in self.cards])
+        self.assertEqual(first.priority, 1)
+        self.assertEqual(first.ease, Decimal('1.20'))
+        self.assertEqual(first.due, timezone.now().date() + timedelta(days=1))
+        self.assertEqual(second.due, answered_at.date() + timedelta(days=1))
+        self.assertEqual(logs.count(), 2)
+        self.assertEqual(logs.last().created_at, answered_at)
+
+    def test_batch_answered_at_with_offset(self):
+        self.client.force_authenticate(self.user)
+        yesterday = timezone.now().date() - timedelta(days=1)
+        answered_at = datetime.combine(yesterday, time(0, 30))
+        data = {'answers': [{
+            'card_id': self.cards[0].id,
+            'action': 'good',
+            # Shortly after midnight local time, the day before in UTC
+            'answered_at': timezone.make_aware(answered_at).isoformat()
+        }]}
+
+        response = self.client.post(
+            reverse(
+                'cards:learn_cards_batch', kwargs={'deck_id': self.deck.id}
+            ),
+            data=data,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        progress = CardProgress.objects.get(user=self.user, card=self.cards[0])
+        self.assertEqual(progress.due, yesterday + timedelta(days=1))
+        self.assertEqual(
+            LearningLog.objects.get(user=self.user).created_at, answered_at
+        )
+        self.assertEqual(
+            LearningDay.objects.get(user=self.user).date, yesterday
+        )
+
+    def test_batch_queries_do_not_grow_with_answers(self):
+        answers = [
+            {'card_id': card.id, 'action': action}
+            for card in self.cards
+            for action in CardProgress.ACTIONS
+        ]
+        CardProgress.objects.apply_answers(self.user, self.deck, answers[:3])
+
+        # progress lookup, new cards lookup, savepoint, progress update,
+        # progress insert, log insert, daily count update,
+        # today's counter update, release
+        with self.assertNumQueries(9):
+            CardProgress.objects.apply_answers(self.user, self.deck, answers)
+
+    def test_learn_creates_progress_on_first_answer(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['words_left'], 5)
+        self.assertFalse(CardProgress.objects.filter(user=self.user).exists())
+
+        response = self.client.post(
+            url,
+            data={'card_id': response.data['id'], 'action': 'again'},
+            format='json'
+        )
+        progress = CardProgress.objects.get(user=self.user)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(progress.stage, CardProgress.NEW)
+        self.assertEqual(progress.priority, 2)
+        self.assertEqual(progress.deck, self.deck)
+
+    def test_learn_step_takes_three_queries(self):
+        CardAdditionalImage.objects.update(
+            hashed_image=HashedImage.objects.create(hash='LKO2?U%2Tw=w')
+        )
+        self.client.force_authenticate(self.user)
+        url = reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id})
+        response = self.client.get(url)
+
+        # answered progress, answer with counters, next card with its
+        # additional images
+        for action in ('again', 'hard', 'good'):
+            with self.assertNumQueries(3):
+                response = self.client.post(
+                    url,
+                    data={'card_id': response.data['id'], 'action': action},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['additional_images']), 4)
+            self.assertEqual(
+                response.data['additional_images'][0]['image_hash'],
+                'LKO2?U%2Tw=w'
+            )
+
+    def test_learn_step_writes_answer(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id})
+        self.client.get(url)
+
+        response = self.client.post(
+            url,
+            data={'card_id': self.cards[0].id, 'action': 'good'},
+            format='json'
+        )
+        progress = CardProgress.objects.get(user=self.user, card=self.cards[0])
+
+        self.assertEqual(response.data['words_left'], 4)
+        self.assertEqual(
+            progress.due, timezone.now().date() + timedelta(days=1)
+        )
+        self.assertEqual(progress.version, 0)
+        self.assertEqual(LearningLog.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(
+            LearningDay.objects.get(user=self.user).count, 1
+        )
+        self.assertEqual(
+            LearnToday.objects.get(user=self.user, deck=self.deck).cards_left,
+            4
+        )
+
+    def test_answer_of_changed_progress_is_reapplied(self):
+        progress = CardProgress.objects.get_for_answer(
+            self.user, self.deck, self.cards[0].id
+        )
+        CardProgress.objects.get_for_answer(
+            self.user, self.deck, self.cards[0].id
+        ).handle_action('again')
+
+        graduated, _ = progress.answer('again')
+        progress.refresh_from_db()
+
+        self.assertFalse(graduated)
+        self.assertEqual(progress.priority, 3)
+        self.assertEqual(progress.version, 1)
+
+    def test_words_left_is_not_recounted(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id})
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.data['words_left'], 5)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_words_left_follows_answers(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id})
+        response = self.client.get(url)
+        answered = {response.data['id']}
+
+        response = self.client.post(
+            url,
+            data={'card_id': response.data['id'], 'action': 'good'},
+            format='json'
+        )
+        self.assertEqual(response.data['words_left'], 4)
+
+        answered.add(response.data['id'])
+        response = self.client.post(
+            url,
+            data={'card_id': response.data['id'], 'action': 'again'},
+            format='json'
+        )
+        self.assertEqual(response.data['words_left'], 4)
+
+        CardProgress.objects.apply_answers(
+            self.user,
+            self.deck,
+            [
+                {'card_id': card.id, 'action': 'good'}
+                for card in self.cards if card.id not in answered
+            ]
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data['words_left'], 1)
+        self.assertEqual(
+            LearnToday.objects.get(user=self.user, deck=self.deck).cards_total,
+            5
+        )
+
+    def test_learn_card_of_not_learned_deck(self):
+        self.client.force_authenticate(self.user)
+        card = CardFactory()
+        response = self.client.post(
+            reverse('cards:learn_cards', kwargs={'deck_id': card.deck.id}),
+            data={'card_id': card.id, 'action': 'good'},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(CardProgress.objects.filter(user=self.user).exists())
+
+    def test_prefetch_cards(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(
+            reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id}),
+            {'prefetch': 3}
+        )
+        cards = response.data['cards']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(cards), 3)
+        self.assertEqual(len({card['id'] for card in cards}), 3)
+        for card in cards:
+            self.assertEqual(len(card['answers']), 3)
+            self.assertIn(card['translation'], card['answers'])
+            self.assertEqual(len(card['additional_images']), 4)
+            self.assertEqual(card['words_left'], 5)
+
+    def test_prefetch_queries_do_not_grow_with_cards(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id})
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as one_card:
+            self.client.get(url, {'prefetch': 1})
+        with CaptureQueriesContext(connection) as all_cards:
+            self.client.get(url, {'prefetch': 5})
+
+        self.assertEqual(len(one_card), len(all_cards))
+
+    def test_progress_follows_card_to_other_deck(self):
+        CardProgress.objects.apply_answers(
+            self.user,
+            self.deck,
+            [{'card_id': self.cards[0].id, 'action': 'again'}]
+        )
+        card = Card.objects.get(id=self.cards[0].id)
+        other_deck = DeckFactory(user=self.user)
+        card.deck = other_deck
+        card.save()
+
+        progress = CardProgress.objects.get(user=self.user, card=card)
+        self.assertEqual(progress.deck, other_deck)
+        self.assertEqual(
+            CardProgress.objects.words_left(self.user, self.deck), 4
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output is PostgreSQL')
+class TestStudyQueryPlans(TestCase):
+    """
+    The study hot path must be answered from the progress indexes
+    """
+    def setUp(self):
+        self.user = UserFactory()
+        self.deck = DeckFactory(user=self.user)
+        CardFactory.create_batch(3, deck=self.deck)
+        self.deck.add_to_user(self.user)
+
+        # Tiny test tables are cheaper to scan, so make the planner
+        # prove an index path exists instead
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertNoSeqScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan on cards_cardprogress', plan, plan)
+        self.assertIn('Index Only Scan using cardprogress_', plan, plan)
+
+    def test_pop_card_plan(self):
+        self.assertNoSeqScan(
+            CardProgress.objects.due_cards(self.user, self.deck)
+            .values('pk')[:1]
+        )
+
+    def test_words_left_plan(self):
+        self.assertNoSeqScan(
+            CardProgress.objects.due_on(
+                self.user, self.deck, timezone.now().date()
+            ).values('pk')
+        )
+
+
+class TestAddDeckToLearning(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.deck = DeckFactory(default=True, user=None)
+        self.cards = CardFactory.create_batch(5, deck=self.deck)
+        self.url = reverse(
+            'cards:add_learning_deck',
+            kwargs={'deck_id': self.deck.id}
+        )
+
+    def test_add_deck_not_authenticated(self):
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_add_deck_is_idempotent(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(self.url)
+        self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            LearningDeck.objects.filter(
+                user=self.user, deck=self.deck
+            ).count(),
+            1
+        )
+
+    def test_add_deck_does_not_create_progress(self):
+        # lookup, savepoint, insert, release whatever the deck size is
+        with self.assertNumQueries(4):
+            self.deck.add_to_user(self.user)
+
+        self.assertFalse(CardProgress.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            CardProgress.objects.words_left(self.user, self.deck), 5
+        )
+
+
+class TestAnswerPool(TestCase):
+    def setUp(self):
+        self.deck = DeckFactory()
+        self.cards = [
+            CardFactory(deck=self.deck, translation=f'translation {i}')
+            for i in range(5)
+        ]
+
+    def test_answers_are_served_from_cache(self):
+        serializer = LearnCardSerializer(context={'words_left': 0})
+        serializer._get_random_answers(self.cards[0], 3)
+
+        with self.assertNumQueries(0):
+            answers = serializer._get_random_answers(self.cards[0], 3)
+
+        self.assertEqual(len(answers), 3)
+        self.assertEqual(len(set(answers)), 3)
+        self.assertIn(self.cards[0].translation, answers)
+
+    def test_pool_is_refreshed_on_card_change(self):
+        get_answer_pool(self.deck.id)
+        card = Card.objects.get(id=self.cards[0].id)
+        card.translation = 'renamed'
+        card.save()
+        self.cards[1].delete()
+
+        pool = get_answer_pool(self.deck.id)
+
+        self.assertIn('renamed', pool)
+        self.assertNotIn(self.cards[1].translation, pool)
+        self.assertEqual(len(pool), 4)
+
+
+class TestRandomCard(APITestCase):
+    def setUp(self):
+        self.deck = DeckFactory()
+        self.cards = CardFactory.create_batch(3, deck=self.deck)
+        self.other_card = CardFactory(image=None)
+        self.url = reverse('cards:random_card')
+
+    def test_random_card(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            response.data['id'],
+            [card.id for card in self.cards + [self.other_card]]
+        )
+
+    def test_random_card_queries_do_not_grow_with_cards(self):
+        self.client.get(self.url)
+
+        # card lookup only, ids come from the cache
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_random_card_filters(self):
+        response = self.client.get(self.url, {'deck': self.other_card.deck_id})
+        self.assertEqual(response.data['id'], self.other_card.id)
+
+        for _ in range(5):
+            response = self.client.get(self.url, {'has_image': 'true'})
+            self.assertIn(
+                response.data['id'], [card.id for card in self.cards]
+            )
+
+        response = self.client.get(
+            self.url, {'deck': self.other_card.deck_id, 'has_image': 'true'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(self.url, {'deck': 'first'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_random_card_reads_one_chunk(self):
+        with mock.patch('cards.cache.CARD_IDS_CHUNK_SIZE', 2):
+            picked = {random_card_id(self.deck.id) for _ in range(50)}
+
+        self.assertEqual(picked, {card.id for card in self.cards})
+
+    def test_card_ids_are_refreshed_per_deck(self):
+        random_card_id(self.deck.id)
+        other_deck = self.other_card.deck
+        with self.captureOnCommitCallbacks(execute=True):
+            CardFactory(deck=other_deck)
+            self.cards[0].description = 'Fixed a typo'
+            self.cards[0].save()
+
+        with self.assertNumQueries(0):
+            random_card_id(self.deck.id)
+
+    def test_card_ids_follow_changed_cards(self):
+        card_ids = {card.id for card in self.cards}
+        for deck_id, has_image in (
+            (self.deck.id, False), (None, False), (None, True)
+        ):
+            random_card_id(deck_id, has_image)
+
+        def picked(deck_id=None, has_image=False):
+            # Read from the cached chunks alone
+            with self.assertNumQueries(0):
+                return {
+                    random_card_id(deck_id, has_image) for _ in range(100)
+                }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card = CardFactory(deck=self.deck)
+        self.assertEqual(picked(self.deck.id), card_ids | {card.id})
+        self.assertIn(card.id, picked(has_image=True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.deck = self.other_card.deck
+            card.save()
+        self.assertEqual(picked(self.deck.id), card_ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.image = None
+            card.save()
+        self.assertNotIn(card.id, picked(has_image=True))
+        self.assertIn(card.id, picked())
+
+        card_id = card.id
+        with self.captureOnCommitCallbacks(execute=True):
+            card.delete()
+        self.assertNotIn(card_id, picked())
+
+    def test_random_card_skips_deleted_cards(self):
+        self.client.get(self.url, {'deck': self.other_card.deck_id})
+        Card.objects.filter(id=self.other_card.id).delete()
+
+        response = self.client.get(self.url, {'deck': self.other_card.deck_id})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestLearningDays(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.deck = DeckFactory(user=self.user)
+        self.cards = CardFactory.create_batch(3, deck=self.deck)
+        self.deck.add_to_user(self.user)
+
+    def test_answers_are_counted_per_day(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        CardProgress.objects.apply_answers(self.user, self.deck, [
+            {'card_id': self.cards[0].id, 'action': 'good'},
+            {'card_id': self.cards[1].id, 'action': 'good',
+             'answered_at': yesterday},
+        ])
+        progress = CardProgress.objects.get_for_answer(
+            self.user, self.deck, self.cards[2].id
+        )
+        progress.handle_action('good')
+
+        days = dict(
+            LearningDay.objects.filter(user=self.user)
+            .values_list('date', 'count')
+        )
+        self.assertEqual(days, {
+            timezone.now().date(): 2,
+            yesterday.date(): 1,
+        })
+
+    def test_backfill_learning_days(self):
+        today = timezone.now()
+        for card in self.cards:
+            LearningLog.objects.create(user=self.user, card=card)
+        LearningLog.objects.create(
+            user=self.user,
+            card=self.cards[0],
+            created_at=today - timedelta(days=3)
+        )
+        LearningDay.objects.create(user=self.user, date=today.date(), count=1)
+
+        call_command('backfill_learning_days', stdout=StringIO())
+
+        days = dict(
+            LearningDay.objects.filter(user=self.user)
+            .values_list('date', 'count')
+        )
+        self.assertEqual(days, {
+            today.date(): 3,
+            (today - timedelta(days=3)).date(): 1,
+        })
+
+
+class TestRollOverLearnToday(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.deck = DeckFactory(user=self.user)
+        self.cards = CardFactory.create_batch(3, deck=self.deck)
+        yesterday = timezone.now().date() - timedelta(days=1)
+        LearningDeck.objects.create(
+            user=self.user, deck=self.deck, date=yesterday
+        )
+        for card in self.cards[:2]:
+            CardProgress.objects.create(
+                user=self.user,
+                card=card,
+                deck=self.deck,
+                due=timezone.now().date()
+            )
+        LearnToday.objects.create(user=self.user, deck=self.deck)
+        LearnToday.objects.update(date=yesterday)
+        self.inactive_user = UserFactory()
+        self.deck.add_to_user(self.inactive_user)
+
+    def test_roll_over_creates_todays_counters(self):
+        roll_over_learn_today()
+        learn_today = LearnToday.objects.get(
+            user=self.user, deck=self.deck, date=timezone.now().date()
+        )
+
+        self.assertEqual(learn_today.cards_total, 2)
+        self.assertEqual(learn_today.cards_left, 2)
+        self.assertFalse(
+            LearnToday.objects.filter(user=self.inactive_user).exists()
+        )
+
+    def test_first_request_after_roll_over(self):
+        roll_over_learn_today()
+        self.client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('cards:learn_cards', kwargs={'deck_id': self.deck.id})
+            )
+
+        self.assertEqual(response.data['words_left'], 2)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] or 'cards_learntoday' in query['sql']
+            for query in queries.captured_queries
+        ))
@@ -0,0 +1,70 @@
+import threading
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from cards.factories import CardFactory, DeckFactory
+from cards.models import CardProgress, LearningLog
+from user.factories import UserFactory
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs concurrent connections')
+class TestConcurrentAnswers(TransactionTestCase):
+    """
+    Parallel answers to one card must all be applied
+    """
+    THREADS = 4
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.deck = DeckFactory(user=self.user)
+        self.card = CardFactory(deck=self.deck)
+        self.deck.add_to_user(self.user)
+
+    def _answer_in_parallel(self, action):
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def answer():
+            try:
+                progress = CardProgress.objects.get_for_answer(
+                    self.user, self.deck, self.card.id
+                )
+                barrier.wait()
+                try:
+                    progress.handle_action(action)
+                    results.append('answered')
+                except CardProgress.Conflict:
+                    results.append('conflict')
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=answer) for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results.count('answered')
+
+    def test_parallel_answers_are_not_lost(self):
+        answered = self._answer_in_parallel('again')
+        progress = CardProgress.objects.get(user=self.user, card=self.card)
+
+        self.assertGreater(answered, 0)
+        # the first answer inserts the row, every other one updates it
+        self.assertEqual(progress.version, answered - 1)
+        self.assertEqual(progress.priority, 1 + answered)
+
+    def test_parallel_graduating_answers_are_logged(self):
+        CardProgress.objects.get_for_answer(
+            self.user, self.deck, self.card.id
+        ).handle_action('again')
+
+        answered = self._answer_in_parallel('good')
+        progress = CardProgress.objects.get(user=self.user, card=self.card)
+
+        self.assertEqual(progress.version, answered)
+        self.assertEqual(LearningLog.objects.count(), answered)
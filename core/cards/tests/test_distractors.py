@@ -0,0 +1,68 @@
+from django.test import TestCase
+
+from cards.distractors import (DistractorIndex, build_deck_index,
+                               update_deck_index)
+from cards.factories import CardFactory, DeckFactory
+from cards.models import Card
+from cards.serializers import LearnCardSerializer
+
+
+class TestDistractorIndex(TestCase):
+    def setUp(self):
+        self.deck = DeckFactory()
+        self.translations = [
+            'house', 'mouse', 'horse', 'houses', 'hose', 'home', 'cat',
+            'elephant', 'giraffe', 'crocodile'
+        ]
+        self.cards = [
+            CardFactory(deck=self.deck, translation=translation)
+            for translation in self.translations
+        ]
+
+    def test_most_similar_translations_first(self):
+        distractors = DistractorIndex(self.translations).find('house', 4)
+
+        self.assertEqual(
+            sorted(distractors),
+            ['horse', 'hose', 'houses', 'mouse']
+        )
+
+    def test_build_deck_index(self):
+        build_deck_index(self.deck.id)
+        card = Card.objects.get(id=self.cards[0].id)
+
+        self.assertEqual(len(card.distractors), 6)
+        self.assertNotIn('house', card.distractors)
+        self.assertNotIn('crocodile', card.distractors)
+
+    def test_update_deck_index_only_touches_affected_cards(self):
+        build_deck_index(self.deck.id)
+        card = Card.objects.get(id=self.cards[0].id)
+        card.translation = 'houze'
+        card.save()
+
+        updated = update_deck_index(
+            self.deck.id, card_ids=[card.id], removed=['house']
+        )
+        mouse = Card.objects.get(id=self.cards[1].id)
+        crocodile = Card.objects.get(id=self.cards[-1].id)
+
+        self.assertLess(updated, len(self.cards))
+        self.assertIn('houze', mouse.distractors)
+        self.assertNotIn('house', mouse.distractors)
+        self.assertEqual(
+            crocodile.distractors,
+            DistractorIndex(
+                [card.translation for card in Card.objects.all()]
+            ).find('crocodile')
+        )
+
+    def test_quiz_answers_come_from_index(self):
+        build_deck_index(self.deck.id)
+        card = Card.objects.get(id=self.cards[0].id)
+
+        with self.assertNumQueries(0):
+            answers = LearnCardSerializer()._get_random_answers(card, 3)
+
+        self.assertIn('house', answers)
+        self.assertTrue(set(answers) - {'house'} <= set(card.distractors))
@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from cards.factories import CardFactory, DeckFactory
+from cards.hashing import file_digest, hash_file
+from cards.models import Card, CardAdditionalImage, Deck, HashedImage
+
+
+class TestGenerateBlurhash(TestCase):
+    def setUp(self):
+        self.deck = DeckFactory()
+        self.cards = CardFactory.create_batch(2, deck=self.deck)
+        self.checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.checkpoint_dir.cleanup)
+        self.checkpoint = os.path.join(self.checkpoint_dir.name, 'checkpoint')
+
+    def _generate(self, *args):
+        call_command(
+            'generate_blurhash',
+            '--workers=1',
+            '--chunk-size=3',
+            f'--checkpoint={self.checkpoint}',
+            *args,
+            stdout=StringIO(),
+            stderr=StringIO()
+        )
+
+    def test_hashes_all_images(self):
+        with self.assertNumQueries(39):
+            self._generate()
+
+        for model in (Deck, Card, CardAdditionalImage):
+            for item in model.objects.select_related('hashed_image'):
+                self.assertEqual(
+                    item.hashed_image.digest, file_digest(item.image.path)
+                )
+                self.assertEqual(
+                    item.hashed_image.hash, hash_file(item.image.path)
+                )
+        # Red deck and additional images, blue cards
+        self.assertEqual(HashedImage.objects.count(), 2)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_skips_hashed_images_unless_forced(self):
+        hashed_image = HashedImage.objects.create(
+            hash='stale', digest=file_digest(self.cards[0].image.path)
+        )
+        Card.objects.filter(pk=self.cards[0].pk).update(
+            hashed_image=hashed_image
+        )
+
+        self._generate()
+        hashed_image.refresh_from_db()
+        self.assertEqual(hashed_image.hash, 'stale')
+        self.assertEqual(
+            Card.objects.get(pk=self.cards[1].pk).hashed_image, hashed_image
+        )
+
+        self._generate('--force')
+        hashed_image.refresh_from_db()
+        self.assertEqual(
+            hashed_image.hash, hash_file(self.cards[0].image.path)
+        )
+        self.assertEqual(HashedImage.objects.count(), 2)
+
+    def test_collapses_duplicates(self):
+        hashed_images = [
+            HashedImage.objects.create(hash=f'legacy {card.pk}')
+            for card in self.cards
+        ]
+        for card, hashed_image in zip(self.cards, hashed_images):
+            Card.objects.filter(pk=card.pk).update(hashed_image=hashed_image)
+
+        self._generate()
+
+        cards = Card.objects.select_related('hashed_image')
+        self.assertEqual(len({card.hashed_image_id for card in cards}), 1)
+        # The hash of a known image is reused rather than computed again
+        self.assertEqual(
+            cards[0].hashed_image.hash, f'legacy {self.cards[0].pk}'
+        )
+        self.assertFalse(
+            HashedImage.objects.filter(pk=hashed_images[1].pk).exists()
+        )
+
+    def test_resumes_from_checkpoint(self):
+        with open(self.checkpoint, 'w') as checkpoint_file:
+            json.dump({
+                'cards.Deck': self.deck.pk,
+                'cards.Card': self.cards[0].pk,
+            }, checkpoint_file)
+
+        self._generate()
+
+        self.assertIsNone(Deck.objects.get().hashed_image)
+        self.assertIsNone(Card.objects.get(pk=self.cards[0].pk).hashed_image)
+        self.assertIsNotNone(
+            Card.objects.get(pk=self.cards[1].pk).hashed_image
+        )
+        self.assertFalse(
+            CardAdditionalImage.objects.filter(hashed_image=None).exists()
+        )
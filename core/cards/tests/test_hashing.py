@@ -0,0 +1,151 @@
+import io
+from unittest import mock
+
+import blurhash
+import numpy as np
+from django.core.files.images import ImageFile
+from django.test import SimpleTestCase, TestCase
+from PIL import Image
+
+from cards import hashing
+from cards.factories import CardFactory
+from cards.models import HashedImage
+from cards.tasks import generate_hashed_images
+
+
+def _gradient(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([
+        x * 255 / width,
+        y * 255 / height,
+        np.sin(x / width * 3) * 100 + rng.integers(60, 140),
+    ], axis=-1)
+    return Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+
+
+def _noisy(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = np.asarray(_gradient(width, height, seed), dtype=np.float64)
+    pixels = pixels + rng.normal(0, 60, pixels.shape)
+    return Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+
+
+def _jpeg(image):
+    image_file = io.BytesIO()
+    image.save(image_file, 'JPEG', quality=95)
+    image_file.seek(0)
+    return image_file
+
+
+class TestHashing(SimpleTestCase):
+    def test_same_hash_as_blurhash_for_small_images(self):
+        for seed, (width, height) in enumerate([(40, 30), (17, 60), (64, 64)]):
+            image = _gradient(width, height, seed)
+            self.assertEqual(
+                hashing.encode(image, x_components=4, y_components=3),
+                blurhash.encode(image.copy(), x_components=4, y_components=3)
+            )
+
+    def test_same_hash_as_blurhash_for_reduced_images(self):
+        image_file = _jpeg(_gradient(1200, 800))
+        expected = blurhash.encode(image_file, x_components=4, y_components=3)
+        image_file.seek(0)
+
+        self.assertEqual(
+            hashing.encode(image_file, x_components=4, y_components=3),
+            expected
+        )
+
+    def test_same_hash_as_blurhash_for_noisy_images(self):
+        # Means of gamma encoded noise are darker than the linear ones
+        for seed in range(3):
+            image_file = _jpeg(_noisy(480, 360, seed))
+            expected = blurhash.encode(
+                image_file, x_components=4, y_components=3
+            )
+            image_file.seek(0)
+
+            self.assertEqual(
+                hashing.encode(image_file, x_components=4, y_components=3),
+                expected
+            )
+
+    def test_reduced_components_match_full_image(self):
+        for image in (_gradient(900, 500, seed=3), _noisy(901, 499, 4)):
+            full = hashing.components(
+                hashing.to_linear(np.asarray(image)), 4, 3
+            )
+            reduced, original_size = hashing.load(image.copy())
+
+            self.assertEqual(max(reduced.shape), hashing.SIZE)
+            np.testing.assert_allclose(
+                hashing.components(reduced, 4, 3, original_size),
+                full,
+                atol=0.0005
+            )
+
+    def test_non_rgb_image(self):
+        image = _gradient(30, 20).convert('L')
+        self.assertEqual(
+            hashing.encode(image.copy()),
+            blurhash.encode(image.copy(), x_components=4, y_components=3)
+        )
+
+    def test_invalid_components(self):
+        with self.assertRaises(ValueError):
+            hashing.encode(_gradient(10, 10), x_components=10)
+
+
+class TestHashedImageDedupe(TestCase):
+    def test_same_content_shares_hashed_image(self):
+        first, second = CardFactory.create_batch(2)
+
+        generate_hashed_images('cards.Card', first.pk)
+        with mock.patch('cards.hashing.hash_file') as hash_file:
+            generate_hashed_images('cards.Card', second.pk)
+
+        hash_file.assert_not_called()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.hashed_image_id, second.hashed_image_id)
+        self.assertEqual(
+            first.hashed_image.digest, hashing.file_digest(first.image.path)
+        )
+        self.assertEqual(
+            first.hashed_image.hash, hashing.hash_file(first.image.path)
+        )
+
+    def test_changed_image_gets_new_hashed_image(self):
+        card = CardFactory()
+        generate_hashed_images('cards.Card', card.pk)
+        card.refresh_from_db()
+        old_hashed_image = card.hashed_image
+
+        card.image = ImageFile(_jpeg(_gradient(30, 20)), name='new.jpg')
+        card.save()
+        generate_hashed_images('cards.Card', card.pk)
+
+        card.refresh_from_db()
+        self.assertNotEqual(card.hashed_image_id, old_hashed_image.pk)
+        self.assertEqual(HashedImage.objects.delete_unused(), 1)
+
+    def test_deleting_hashed_image_keeps_cards(self):
+        card = CardFactory()
+        generate_hashed_images('cards.Card', card.pk)
+        card.refresh_from_db()
+
+        card.hashed_image.delete()
+
+        card.refresh_from_db()
+        self.assertIsNone(card.hashed_image)
+
+    def test_delete_unused_skips_rows_in_use(self):
+        card = CardFactory()
+        generate_hashed_images('cards.Card', card.pk)
+        unused = HashedImage.objects.create(hash='unused')
+
+        self.assertEqual(HashedImage.objects.delete_unused(), 1)
+        self.assertFalse(HashedImage.objects.filter(pk=unused.pk).exists())
+        card.refresh_from_db()
+        self.assertIsNotNone(card.hashed_image)
@@ -0,0 +1,57 @@
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase
+
+from cards.factories import CardFactory
+from cards.models import Card, Deck, HashedImage
+from core import identity_map
+from core.middleware import IdentityMapMiddleware
+
+
+class TestIdentityMap(TestCase):
+    def setUp(self):
+        self.card = CardFactory()
+        self.card.hashed_image = HashedImage.objects.create(
+            hash='LKO2?U%2Tw=w'
+        )
+        self.card.save()
+
+    def _in_request(self, view):
+        middleware = IdentityMapMiddleware(lambda request: view())
+        return middleware(RequestFactory().get('/'))
+
+    def test_rows_are_loaded_once_per_request(self):
+        def view():
+            with self.assertNumQueries(1):
+                first = identity_map.get(Deck, self.card.deck_id)
+                second = identity_map.get_object_or_404(
+                    Deck, str(self.card.deck_id)
+                )
+            self.assertIs(first, second)
+            return HttpResponse()
+
+        self._in_request(view)
+
+    def test_image_hash_shares_rows(self):
+        def view():
+            cards = [Card.objects.get(id=self.card.id) for _ in range(2)]
+            with self.assertNumQueries(1):
+                hashes = [card.image_hash for card in cards]
+            self.assertEqual(hashes, ['LKO2?U%2Tw=w'] * 2)
+            return HttpResponse()
+
+        self._in_request(view)
+
+    def test_map_is_cleared_after_request(self):
+        self._in_request(lambda: HttpResponse(
+            identity_map.get(Deck, self.card.deck_id)
+        ))
+
+        with self.assertNumQueries(2):
+            identity_map.get(Deck, self.card.deck_id)
+            identity_map.get(Deck, self.card.deck_id)
+
+    def test_missing_row(self):
+        with self.assertRaises(Http404):
+            identity_map.get_object_or_404(Deck, 0)
+        with self.assertRaises(Http404):
+            identity_map.get_object_or_404(Deck, 'first')
@@ -0,0 +1,120 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from cards import queues, scheduling
+from cards.factories import CardFactory, DeckFactory
+from cards.models import CardProgress
+from cards.tasks import reconcile_due_queues
+from user.factories import UserFactory
+from .fakes import FakeRedis
+
+
+@override_settings(CARDS_DUE_QUEUE_URL='redis://queue')
+class TestDueQueue(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            'cards.queues.redis.Redis.from_url',
+            side_effect=lambda url: FakeRedis()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(queues._queues.clear)
+
+        self.user = UserFactory()
+        self.deck = DeckFactory(user=self.user)
+        self.cards = CardFactory.create_batch(3, deck=self.deck)
+        today = timezone.now().date()
+        self.failed, self.review, self.later = [
+            CardProgress.objects.create(
+                user=self.user,
+                card=card,
+                deck=self.deck,
+                due=due,
+                priority=priority
+            )
+            for card, due, priority in zip(
+                self.cards,
+                (today, today - timedelta(days=2), today + timedelta(days=1)),
+                (3, 1, 1)
+            )
+        ]
+        self.queue = queues.get_due_queue()
+
+    def test_reschedule_makes_queue_cold(self):
+        CardProgress.objects.pop_card(self.user, self.deck)
+        self.assertTrue(self.queue.is_warm(self.user.id, self.deck.id))
+
+        sm2 = scheduling.get_scheduler('sm2')
+        CardProgress.objects.reschedule(sm2, sm2)
+
+        self.assertFalse(self.queue.is_warm(self.user.id, self.deck.id))
+
+    def test_cold_queue_is_filled_on_first_read(self):
+        self.assertFalse(self.queue.is_warm(self.user.id, self.deck.id))
+
+        progress = CardProgress.objects.pop_card(self.user, self.deck)
+
+        self.assertEqual(progress, self.review)
+        self.assertTrue(self.queue.is_warm(self.user.id, self.deck.id))
+
+    def test_pop_card_from_queue(self):
+        CardProgress.objects.pop_card(self.user, self.deck)
+
+        # progress row of the queued card
+        with self.assertNumQueries(1):
+            progress = CardProgress.objects.pop_card(self.user, self.deck)
+        self.assertEqual(progress, self.review)
+
+        progress.handle_action('good')
+        # no reviews and new cards left, the failed card comes last
+        self.assertEqual(
+            CardProgress.objects.pop_card(self.user, self.deck), self.failed
+        )
+
+    def test_answers_are_written_through(self):
+        CardProgress.objects.pop_card(self.user, self.deck)
+
+        self.review.handle_action('again')
+        self.failed.handle_action('good')
+
+        self.assertEqual(
+            CardProgress.objects.pop_card(self.user, self.deck), self.review
+        )
+        self.review.handle_action('good')
+        self.assertIsNone(CardProgress.objects.pop_card(self.user, self.deck))
+
+    def test_batch_answers_are_written_through(self):
+        CardProgress.objects.pop_card(self.user, self.deck)
+
+        CardProgress.objects.apply_answers(self.user, self.deck, [
+            {'card_id': self.review.card_id, 'action': 'good'},
+            {'card_id': self.failed.card_id, 'action': 'good'},
+        ])
+
+        self.assertIsNone(CardProgress.objects.pop_card(self.user, self.deck))
+
+    def test_stale_entries_are_dropped(self):
+        CardProgress.objects.pop_card(self.user, self.deck)
+        CardProgress.objects.filter(id=self.review.id).delete()
+
+        self.assertEqual(
+            CardProgress.objects.pop_card(self.user, self.deck), self.failed
+        )
+        self.assertIsNone(self.queue.first(
+            self.user.id, self.deck.id, queues.REVIEWS, timezone.now().date()
+        ))
+
+    def test_reconcile_rebuilds_queues(self):
+        CardProgress.objects.pop_card(self.user, self.deck)
+        CardProgress.objects.filter(id=self.later.id).update(
+            due=timezone.now().date() - timedelta(days=5)
+        )
+
+        reconcile_due_queues()
+
+        self.assertEqual(
+            CardProgress.objects.pop_card(self.user, self.deck), self.later
+        )
@@ -0,0 +1,80 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from cards.factories import CardFactory
+from cards.models import LearningDay, LearningLog
+from cards.retention import archive_learning_log
+from user.factories import UserFactory
+
+
+class TestArchiveLearningLog(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.card = CardFactory()
+        self.now = timezone.now()
+        self.old_date = (self.now - timedelta(days=400)).date()
+        old_time = datetime.combine(self.old_date, time(12))
+        self.old_logs = [
+            LearningLog.objects.create(
+                user=self.user,
+                card=self.card,
+                created_at=old_time - timedelta(minutes=i)
+            )
+            for i in range(5)
+        ]
+        self.recent_log = LearningLog.objects.create(
+            user=self.user, card=self.card
+        )
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+
+    def _archived_rows(self):
+        rows = []
+        for name in sorted(os.listdir(self.archive_dir.name)):
+            path = os.path.join(self.archive_dir.name, name)
+            with gzip.open(path, 'rt') as f:
+                rows += [json.loads(line) for line in f]
+        return rows
+
+    def test_old_logs_are_archived_and_deleted(self):
+        archived = archive_learning_log(
+            before=self.now - timedelta(days=365),
+            archive_dir=self.archive_dir.name,
+            batch_size=2
+        )
+        rows = self._archived_rows()
+
+        self.assertEqual(archived, 5)
+        self.assertEqual(len(os.listdir(self.archive_dir.name)), 3)
+        self.assertEqual(
+            sorted(row['id'] for row in rows),
+            sorted(log.id for log in self.old_logs)
+        )
+        self.assertEqual(rows[0]['user_id'], self.user.id)
+        self.assertEqual(
+            list(LearningLog.objects.values_list('id', flat=True)),
+            [self.recent_log.id]
+        )
+
+    def test_old_days_are_rolled_up(self):
+        LearningDay.objects.create(
+            user=self.user, date=self.now.date(), count=1
+        )
+        archive_learning_log(
+            before=self.now - timedelta(days=365),
+            archive_dir=self.archive_dir.name,
+            batch_size=2
+        )
+
+        days = dict(
+            LearningDay.objects.filter(user=self.user)
+            .values_list('date', 'count')
+        )
+        self.assertEqual(days[self.old_date], 5)
+        self.assertEqual(days[self.now.date()], 1)
@@ -0,0 +1,280 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from cards import scheduling, simulator
+from cards.factories import CardFactory, DeckFactory
+from cards.models import CardProgress, LearnToday
+from user.factories import UserFactory
+
+
+class TestSchedule(SimpleTestCase):
+    today = date(2024, 1, 10)
+
+    def test_again_keeps_card_today(self):
+        transition = scheduling.schedule(
+            scheduling.NEW, Decimal('1.05'), 1, 'again', self.today,
+            due=self.today
+        )
+
+        self.assertEqual(transition.due, self.today)
+        self.assertEqual(transition.ease, scheduling.MIN_EASE)
+        self.assertEqual(transition.priority, 2)
+        self.assertFalse(transition.log)
+        self.assertTrue(transition.save)
+
+    def test_good_graduates_card(self):
+        transition = scheduling.schedule(
+            scheduling.NEW, Decimal('1.05'), 4, 'good', self.today
+        )
+
+        self.assertEqual(transition.stage, scheduling.NEW)
+        self.assertEqual(transition.ease, Decimal('1.20'))
+        self.assertEqual(transition.due, self.today + timedelta(days=1))
+        self.assertEqual(transition.priority, 1)
+        self.assertTrue(transition.log)
+
+    def test_stages(self):
+        learning = scheduling.schedule(
+            scheduling.NEW, Decimal('1.90'), 1, 'good', self.today
+        )
+        review = scheduling.schedule(
+            scheduling.LEARNING, Decimal('3.00'), 1, 'good', self.today
+        )
+        in_review = scheduling.schedule(
+            scheduling.REVIEW, Decimal('3.00'), 1, 'good', self.today
+        )
+
+        self.assertEqual(learning.stage, scheduling.LEARNING)
+        self.assertEqual(learning.due, self.today + timedelta(days=2))
+        self.assertEqual(review.stage, scheduling.REVIEW)
+        self.assertEqual(review.due, self.today + timedelta(days=6))
+        self.assertEqual(in_review.ease, Decimal('3.25'))
+        self.assertEqual(in_review.due, self.today + timedelta(days=9))
+
+    def test_invalid_action(self):
+        with self.assertRaises(ValueError):
+            scheduling.schedule(
+                scheduling.NEW, Decimal('1.05'), 1, 'easy', self.today
+            )
+
+
+class TestSimulator(SimpleTestCase):
+    def test_transition_matches_schedule(self):
+        rng = np.random.default_rng(0)
+        stage = rng.integers(0, 4, 2000).astype(np.int8)
+        ease = rng.integers(105, 400, 2000).astype(np.int32)
+        actions = rng.integers(0, 3, 2000)
+        today = date(2024, 1, 10)
+
+        new_stage, new_ease, interval = simulator.transition(
+            stage, ease, actions, simulator.default_rules()
+        )
+
+        for i in range(len(stage)):
+            expected = scheduling.schedule(
+                int(stage[i]),
+                Decimal(int(ease[i])) / 100,
+                1,
+                scheduling.ACTIONS[actions[i]],
+                today
+            )
+            self.assertEqual(new_stage[i], expected.stage)
+            self.assertEqual(Decimal(int(new_ease[i])) / 100, expected.ease)
+            self.assertEqual(
+                today + timedelta(days=int(interval[i])), expected.due
+            )
+
+    def test_simulate(self):
+        result = simulator.simulate(
+            1000, 30, new_per_day=100, max_cards=150, seed=1
+        )
+
+        self.assertEqual(result.due[0], 100)
+        self.assertEqual(result.backlog[0], 0)
+        self.assertGreater(result.backlog[-1], 0)
+        self.assertTrue((result.reviews >= result.due - result.backlog).all())
+        self.assertEqual(len(result.review_days), 1000)
+
+    def test_simulate_command(self):
+        out = StringIO()
+        call_command(
+            'simulate_schedule', cards=500, days=14, seed=1,
+            answers='0.1,0.1,0.8', ease_steps='-0.2,-0.1,0.3', stdout=out
+        )
+
+        self.assertIn('Reviews:', out.getvalue())
+        self.assertIn('Review stage:', out.getvalue())
+
+
+class TestFSRSScheduler(SimpleTestCase):
+    today = date(2024, 1, 10)
+    scheduler = scheduling.get_scheduler('fsrs')
+
+    def test_again_keeps_card_today(self):
+        transition = self.scheduler.schedule(
+            scheduling.REVIEW, Decimal('10.00'), 1, 'again', self.today
+        )
+
+        self.assertEqual(transition.stage, scheduling.RELEARNING)
+        self.assertEqual(transition.ease, Decimal('5.00'))
+        self.assertEqual(transition.due, self.today)
+        self.assertEqual(transition.priority, 2)
+        self.assertFalse(transition.log)
+
+    def test_good_grows_interval(self):
+        first = self.scheduler.schedule(
+            scheduling.NEW, Decimal('1.05'), 1, 'good', self.today
+        )
+        second = self.scheduler.schedule(
+            first.stage, first.ease, first.priority, 'good', first.due
+        )
+
+        self.assertEqual(first.stage, scheduling.LEARNING)
+        self.assertEqual(first.due, self.today + timedelta(days=3))
+        self.assertTrue(first.log)
+        self.assertEqual(second.stage, scheduling.REVIEW)
+        self.assertGreater(second.due - first.due, timedelta(days=6))
+
+    def test_unknown_scheduler(self):
+        with self.assertRaises(ValueError):
+            scheduling.get_scheduler('sm5')
+
+    def test_incomplete_scheduler(self):
+        class Incomplete(scheduling.Scheduler):
+            name = 'incomplete'
+
+            def schedule(self, stage, ease, priority, action, today,
+                         due=None):
+                pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class TestReschedule(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.deck = DeckFactory(user=self.user)
+        self.cards = CardFactory.create_batch(3, deck=self.deck)
+        self.today = timezone.now().date()
+        self.progress = [
+            CardProgress.objects.create(
+                user=self.user,
+                card=card,
+                deck=self.deck,
+                stage=scheduling.REVIEW,
+                ease=Decimal('2.50'),
+                due=self.today + timedelta(days=days)
+            )
+            for card, days in zip(self.cards, (-1, 3, 7))
+        ]
+
+    def test_reschedule_to_same_scheduler_keeps_progress(self):
+        sm2 = scheduling.get_scheduler('sm2')
+        CardProgress.objects.reschedule(sm2, sm2, chunk_size=2)
+
+        for progress in self.progress:
+            progress.refresh_from_db()
+            self.assertEqual(progress.ease, Decimal('2.50'))
+        self.assertEqual(
+            [progress.due for progress in self.progress],
+            [self.today + timedelta(days=days) for days in (-1, 3, 7)]
+        )
+
+    def test_reschedule_to_fsrs(self):
+        updated = CardProgress.objects.reschedule(
+            scheduling.get_scheduler('fsrs'),
+            scheduling.get_scheduler('sm2'),
+            chunk_size=2
+        )
+
+        for progress in self.progress:
+            progress.refresh_from_db()
+            # 3 days review interval with 2.50 ease
+            self.assertEqual(progress.ease, Decimal('7.50'))
+        self.assertEqual(updated, 3)
+        self.assertEqual(self.progress[0].due, self.today - timedelta(days=1))
+        self.assertEqual(self.progress[1].due, self.today + timedelta(days=3))
+
+    def test_reschedule_bumps_version_and_counters(self):
+        learn_today = LearnToday.objects.create(user=self.user, deck=self.deck)
+        # Stability above the FSRS maximum pulls the card due in 3 days
+        # onto today
+        sm2 = scheduling.get_scheduler('sm2')
+        CardProgress.objects.filter(pk=self.progress[1].pk).update(
+            ease=Decimal('400')
+        )
+        left = learn_today.cards_left
+
+        CardProgress.objects.reschedule(
+            scheduling.get_scheduler('fsrs'), sm2, today=self.today
+        )
+
+        self.progress[1].refresh_from_db()
+        self.assertEqual(self.progress[1].due, self.today)
+        learn_today.refresh_from_db()
+        self.assertEqual(learn_today.cards_left, left + 1)
+        self.assertEqual(
+            set(CardProgress.objects.values_list('version', flat=True)), {1}
+        )
+
+    def test_reschedule_counters_take_one_query_per_chunk(self):
+        decks = DeckFactory.create_batch(3, user=self.user)
+        for deck in decks:
+            CardProgress.objects.create(
+                user=self.user,
+                card=CardFactory(deck=deck),
+                deck=deck,
+                stage=scheduling.REVIEW,
+                ease=Decimal('400'),
+                due=self.today + timedelta(days=3)
+            )
+        rows = [
+            LearnToday.objects.create(user=self.user, deck=deck)
+            for deck in decks
+        ]
+        left = [row.cards_left for row in rows]
+        deck_ids = [deck.id for deck in decks]
+
+        # savepoint, locked chunk, progress update, counters update,
+        # release, then the empty last chunk in its own transaction
+        with self.assertNumQueries(8):
+            CardProgress.objects.reschedule(
+                scheduling.get_scheduler('fsrs'),
+                scheduling.get_scheduler('sm2'),
+                today=self.today,
+                deck_id__in=deck_ids
+            )
+
+        for row, cards_left in zip(rows, left):
+            row.refresh_from_db()
+            self.assertEqual(row.cards_left, cards_left + 1)
+
+    @override_settings(CARDS_SCHEDULER='fsrs')
+    def test_reschedule_command(self):
+        other_deck = DeckFactory(user=self.user)
+        other = CardProgress.objects.create(
+            user=self.user,
+            card=CardFactory(deck=other_deck),
+            deck=other_deck,
+            stage=scheduling.REVIEW,
+            ease=Decimal('2.50')
+        )
+        call_command(
+            'reschedule', '--from', 'sm2', '--deck', str(self.deck.id),
+            stdout=StringIO()
+        )
+        other.refresh_from_db()
+        self.progress[2].refresh_from_db()
+
+        self.assertEqual(other.ease, Decimal('2.50'))
+        self.assertEqual(self.progress[2].ease, Decimal('7.50'))
+
+        self.progress[2].handle_action('good')
+        self.assertGreater(self.progress[2].ease, Decimal('7.50'))
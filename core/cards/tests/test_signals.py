@@ -0,0 +1,143 @@
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase
+
+from cards.factories import CardFactory, DeckFactory
+from cards.models import Card, CardAdditionalImage, Deck
+from cards.signals import (remove_card_distractors, set_card_additional_images,
+                           set_card_images, set_deck_images,
+                           update_card_distractors)
+
+
+class TestDirtyFields(TestCase):
+    def test_changed_fields(self):
+        card = Card.objects.get(pk=CardFactory().pk)
+        self.assertEqual(card.changed_fields(), set())
+
+        card.description = 'Fixed a typo'
+        self.assertEqual(card.changed_fields(), set())
+
+        card.word = 'new'
+        card.image = 'cards/other.jpg'
+        self.assertEqual(card.changed_fields(), {'word', 'image'})
+
+        card.save(update_fields=['word'])
+        self.assertEqual(card.changed_fields(), {'image'})
+        self.assertEqual(card.loaded_value('word'), 'new')
+
+        card.save()
+        self.assertEqual(card.changed_fields(), set())
+
+    def test_new_instances_changed(self):
+        card = Card(word='word', translation='translation')
+        self.assertEqual(card.changed_fields(), set(Card.tracked_fields))
+
+
+class TestImageTasks(TestCase):
+    def setUp(self):
+        self.card = Card.objects.get(pk=CardFactory().pk)
+        for receiver, sender in (
+            (set_card_images, Card),
+            (set_deck_images, Deck),
+            (set_card_additional_images, CardAdditionalImage),
+        ):
+            post_save.connect(receiver, sender=sender)
+            self.addCleanup(post_save.disconnect, receiver, sender=sender)
+
+    def _tasks(self, callbacks):
+        return [
+            callback.task_key for callback in callbacks
+            if hasattr(callback, 'task_key')
+        ]
+
+    def test_unrelated_change_enqueues_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.card.description = 'Fixed a typo'
+            self.card.save()
+
+        self.assertEqual(self._tasks(callbacks), [])
+
+    def test_changed_image_and_word(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.card.word = 'new'
+            self.card.image.save('new.png', ContentFile(b'new'), save=False)
+            self.card.save()
+            # Saved again in the same transaction
+            self.card.word = 'newer'
+            self.card.save()
+
+        self.assertEqual(self._tasks(callbacks), [
+            (
+                'cards.tasks.generate_hashed_images',
+                ('cards.Card', self.card.pk)
+            ),
+            (
+                'cards.tasks.set_additional_images_task',
+                (self.card.pk, None)
+            ),
+        ])
+
+    def test_new_image_enqueued_once(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            image = CardAdditionalImage(card=self.card)
+            image.image.save('image.png', ContentFile(b'image'))
+            image.save()
+
+        self.assertEqual(self._tasks(callbacks), [(
+            'cards.tasks.generate_hashed_images',
+            ('cards.CardAdditionalImage', image.pk)
+        )])
+
+    def test_deck_without_image(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            DeckFactory(image=None)
+
+        self.assertEqual(self._tasks(callbacks), [])
+
+
+class TestDistractorTasks(TestCase):
+    def setUp(self):
+        self.deck, self.other = DeckFactory.create_batch(2)
+        self.cards = CardFactory.create_batch(3, deck=self.deck)
+        post_save.connect(update_card_distractors, sender=Card)
+        self.addCleanup(
+            post_save.disconnect, update_card_distractors, sender=Card
+        )
+        post_delete.connect(remove_card_distractors, sender=Card)
+        self.addCleanup(
+            post_delete.disconnect, remove_card_distractors, sender=Card
+        )
+
+    def _sent(self, callbacks):
+        target = 'cards.signals.update_distractor_index.delay'
+        with mock.patch(target) as delay:
+            for callback in callbacks:
+                callback()
+        return sorted(call.args for call in delay.call_args_list)
+
+    def test_one_task_per_deck(self):
+        removed = sorted(card.translation for card in self.cards)
+        with self.captureOnCommitCallbacks() as callbacks:
+            new = CardFactory.create_batch(2, deck=self.deck)
+            self.cards[0].translation = 'renamed'
+            self.cards[0].save()
+            self.cards[1].deck = self.other
+            self.cards[1].save()
+            self.cards[2].delete()
+
+        self.assertEqual(self._sent(callbacks), [
+            (
+                self.deck.id,
+                sorted([new[0].id, new[1].id, self.cards[0].id]),
+                removed
+            ),
+            (self.other.id, [self.cards[1].id], []),
+        ])
+
+    def test_deleted_deck_is_not_rebuilt(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.deck.delete()
+
+        self.assertEqual(self._sent(callbacks), [])
@@ -0,0 +1,127 @@
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase
+
+from cards.factories import CardFactory, DeckFactory
+from cards.models import Card
+from core.storage import ContentAddressedStorage
+from user.factories import UserFactory
+
+
+class TestContentAddressedStorage(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.refs = tempfile.TemporaryDirectory()
+        self.addCleanup(self.refs.cleanup)
+        self.storage = ContentAddressedStorage(
+            location=self.root.name,
+            base_url='/media/',
+            refs_location=self.refs.name
+        )
+
+    def test_identical_files_share_one_file(self):
+        first = self.storage.save('cards/cat.JPG', ContentFile(b'cat'))
+        second = self.storage.save('cards/kitten.jpg', ContentFile(b'cat'))
+        other = self.storage.save('cards/dog.jpg', ContentFile(b'dog'))
+
+        self.assertTrue(first.startswith('cards/'))
+        self.assertTrue(first.endswith('.jpg'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(self.storage.references(first), 2)
+        self.assertEqual(self.storage.url(first), f'/media/{first}')
+        with self.storage.open(first) as stored:
+            self.assertEqual(stored.read(), b'cat')
+
+    def test_file_removed_with_last_reference(self):
+        names = [
+            self.storage.save('decks/deck.png', ContentFile(b'deck'))
+            for _ in range(2)
+        ]
+        self.assertEqual(names[0], names[1])
+        self.assertEqual(self.storage.references(names[0]), 2)
+
+        self.storage.delete(names[0])
+        self.assertTrue(self.storage.exists(names[0]))
+        self.assertEqual(self.storage.references(names[0]), 1)
+
+        self.storage.delete(names[1])
+        self.assertFalse(self.storage.exists(names[0]))
+        self.assertEqual(self.storage.references(names[0]), 0)
+        self.assertEqual(os.listdir(os.path.join(self.refs.name, 'decks')), [])
+
+        name = self.storage.save('decks/deck.png', ContentFile(b'deck'))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.references(name), 1)
+
+    def test_sidecars_are_not_served(self):
+        name = self.storage.save('cards/cat.jpg', ContentFile(b'cat'))
+
+        self.assertEqual(os.listdir(os.path.join(self.root.name, 'cards')), [
+            os.path.basename(name)
+        ])
+        self.assertTrue(os.path.exists(
+            os.path.join(self.refs.name, name + '.refs')
+        ))
+
+    def test_files_without_sidecar(self):
+        path = os.path.join(self.root.name, 'avatars', 'old.png')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as old_file:
+            old_file.write(b'old')
+
+        self.assertEqual(self.storage.references('avatars/old.png'), 1)
+        self.storage.delete('avatars/old.png')
+        self.assertFalse(self.storage.exists('avatars/old.png'))
+
+
+class TestSharedImages(TestCase):
+    def test_cards_share_image_file(self):
+        first, second = CardFactory.create_batch(2)
+
+        self.assertIsInstance(default_storage, ContentAddressedStorage)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.url.startswith('/media/cards/'))
+        self.assertGreaterEqual(
+            default_storage.references(first.image.name), 2
+        )
+
+    def test_deleting_card_releases_image(self):
+        card = CardFactory()
+        name = card.image.name
+        references = default_storage.references(name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Card.objects.filter(pk=card.pk).delete()
+
+        self.assertEqual(default_storage.references(name), references - 1)
+
+    def test_replacing_image_releases_previous(self):
+        deck = DeckFactory()
+        name = deck.image.name
+        references = default_storage.references(name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deck.image = ContentFile(b'other', name='other.png')
+            deck.save()
+
+        self.assertNotEqual(deck.image.name, name)
+        self.assertEqual(default_storage.references(name), references - 1)
+
+    def test_replacing_avatar_releases_previous(self):
+        user = UserFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar = ContentFile(b'first', name='first.png')
+            user.save()
+        name = user.avatar.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar = ContentFile(b'second', name='second.png')
+            user.save()
+
+        self.assertEqual(default_storage.references(name), 0)
+        self.assertFalse(default_storage.exists(name))
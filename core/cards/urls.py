@@ -16,6 +16,11 @@ urlpatterns += [
         views.LearnCardsView.as_view(),
         name='learn_cards'
     ),
+    path(
+        'learn/<int:deck_id>/batch/',
+        views.LearnCardsBatchView.as_view(),
+        name='learn_cards_batch'
+    ),
     path(
         'add_deck/<int:deck_id>/',
         views.AddDeckToLearningView.as_view(),
@@ -1,9 +1,9 @@
 
 import requests
 import os
-import blurhash
 
 from django.conf import settings
+from django.db import transaction
 
 from core.utils import save_image_from_url
 from cards.models import HashedImage, Card, CardAdditionalImage
@@ -30,19 +30,17 @@ def set_additional_images(card_id, api_key):
 
 
 def generate_hash_for_instance(instance):
-    hash = None
-
-    try:
-        with open(instance.image.path, 'rb') as image_file:
-            hash = blurhash.encode(image_file, x_components=4, y_components=3)
-    except (FileNotFoundError, ValueError):
-        pass
-
-    if instance.hashed_image:
-        hashed_image = instance.hashed_image
-        hashed_image.hash = hash
-        hashed_image.save()
-    else:
-        hashed_image = HashedImage.objects.create(hash=hash)
+    """
+    Point the instance at the HashedImage of its image content
+    """
+    with transaction.atomic():
+        # Locked until the instance points at it
+        hashed_image = HashedImage.objects.for_file(instance.image.path)
+        if hashed_image is None or instance.hashed_image_id == hashed_image.id:
+            return
+
         instance.hashed_image = hashed_image
-        instance.save()
+        # update() does not send post_save, which would queue hashing again
+        type(instance).objects.filter(pk=instance.pk).update(
+            hashed_image=hashed_image
+        )
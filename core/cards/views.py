@@ -1,8 +1,5 @@
-import random
-
-from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from django.utils import timezone
+from django.http import Http404
+from django.db.models import Q, prefetch_related_objects
 
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
@@ -10,14 +7,17 @@ from rest_framework.response import Response
 from rest_framework.parsers import JSONParser
 from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 
+from core import identity_map
+from cards.cache import invalidate_card_ids, random_card_id
 from cards.models import Card, CardProgress, Deck, LearnToday
 from .serializers import (
     CardDetailSerializer,
     CardSerializer,
     DeckSerializer,
     LearnCardSerializer,
+    LearnBatchSerializer,
     DeckDetailSerializer
 )
 
@@ -81,14 +81,19 @@ class LearnCardsView(APIView):
     renderer_classes = [JSONRenderer]
     parser_classes = [JSONParser]
     permission_classes = [IsAuthenticated]
-    serializer_class = LearnCardSerializer 
+    serializer_class = LearnCardSerializer
+    MAX_PREFETCH = 50
 
     def get(self, request, *args, **kwargs):
-        deck = get_object_or_404(Deck, id=kwargs.get('deck_id'))
+        deck = identity_map.get_object_or_404(Deck, kwargs.get('deck_id'))
         return self._process_get_next_card(deck)
 
     def post(self, request, *args, **kwargs):
-        deck = get_object_or_404(Deck, id=kwargs.get('deck_id'))
+        """
+        Answer a card and return the next one. The answered progress,
+        the answer with today's counters and the next card with its
+        images take one query each.
+        """
         action = self._validate_action(request.data.get('action'))
 
         if not self._is_valid_action(action):
@@ -97,73 +102,174 @@ class LearnCardsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        progress = get_object_or_404(
-            CardProgress,
-            card__id=request.data.get('card_id'),
-            card__deck=deck,
-            user=request.user
-        )
-        progress.handle_action(action)
-        return self._process_get_next_card(deck)
-    
-    def get_cards_total(self, user, deck):
-        date = timezone.now().date()
-        obj, _ = LearnToday.objects.get_or_create(
-            user=user, deck=deck, date=date
-        )
-        return obj.cards_total
-
+        try:
+            progress = CardProgress.objects.answer_target(
+                request.user,
+                int(kwargs.get('deck_id')),
+                int(request.data.get('card_id'))
+            )
+        except (CardProgress.DoesNotExist, ValueError, TypeError):
+            raise Http404
+        try:
+            _, counters = progress.answer(action)
+        except CardProgress.Conflict as e:
+            return Response(
+                data={'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        identity_map.add(progress.deck, progress.card)
+        return self._process_get_next_card(progress.deck, counters)
 
     def _is_valid_action(self, action):
         return action in CardProgress.ACTIONS
 
-    def _process_get_next_card(self, deck):
-        cards_total = self.get_cards_total(self.request.user, deck)
+    def _get_prefetch(self):
+        try:
+            prefetch = int(self.request.query_params.get('prefetch', 0))
+        except ValueError:
+            return 0
+        return max(0, min(prefetch, self.MAX_PREFETCH))
+
+    def _process_get_next_card(self, deck, counters=None):
+        cards_total, words_left = counters or LearnToday.objects.counters(
+            self.request.user, deck
+        )
+        prefetch = self._get_prefetch()
+        if prefetch:
+            return self._process_get_next_cards(
+                deck, cards_total, words_left, prefetch
+            )
+
         progress = CardProgress.objects.pop_card(self.request.user, deck)
         if not progress:
             return Response(
                 data={'status': 'finished'},
                 status=status.HTTP_200_OK
             )
+        identity_map.add(progress.card)
 
         serializer = self.serializer_class(
             progress.card,
             context={
                 'request': self.request,
-                'user' : self.request.user,
-                'cards_total': cards_total
+                'user': self.request.user,
+                'cards_total': cards_total,
+                'words_left': words_left,
             }
         )
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
+    def _process_get_next_cards(self, deck, cards_total, words_left, count):
+        """
+        Return the next count cards to learn with a fixed number of queries
+        """
+        user = self.request.user
+        progresses = CardProgress.objects.next_cards(user, deck, count)
+        cards = [progress.card for progress in progresses]
+        if not cards:
+            return Response(
+                data={'status': 'finished'},
+                status=status.HTTP_200_OK
+            )
+        prefetch_related_objects(cards, 'additional_images__hashed_image')
+
+        serializer = self.serializer_class(
+            cards,
+            many=True,
+            context={
+                'request': self.request,
+                'user': user,
+                'cards_total': cards_total,
+                'words_left': words_left,
+            }
+        )
+        return Response(
+            data={'cards': serializer.data},
+            status=status.HTTP_200_OK
+        )
+
     def _validate_action(self, action):
         if action not in ['again', 'hard', 'good']:
             return None
         return action
 
 
+class LearnCardsBatchView(LearnCardsView):
+    """
+    Apply a burst of answers at once and return the next card
+    """
+    http_method_names = ['post', 'options']
+
+    def post(self, request, *args, **kwargs):
+        deck = identity_map.get_object_or_404(Deck, kwargs.get('deck_id'))
+        serializer = LearnBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            CardProgress.objects.apply_answers(
+                request.user,
+                deck,
+                serializer.validated_data['answers']
+            )
+        except CardProgress.DoesNotExist as e:
+            return Response(
+                data={'error': str(e)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except CardProgress.Conflict as e:
+            return Response(
+                data={'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
+        return self._process_get_next_card(deck)
+
+
 class RandomCardView(APIView):
+    """
+    Random card, optionally of a deck or only with an image.
+    Picks from the cached card ids so the table is never loaded.
+    """
+    MAX_ATTEMPTS = 3
+
     def get(self, request, *args, **kwargs):
-        cards = Card.objects.all()
-        if not cards:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+        deck_id = self._get_deck_id()
+        has_image = request.query_params.get('has_image') in ('1', 'true')
+
+        for _ in range(self.MAX_ATTEMPTS):
+            card_id = random_card_id(deck_id, has_image)
+            if card_id is None:
+                break
+            random_card = Card.objects.filter(id=card_id).first()
+            if random_card:
+                serializer = CardSerializer(
+                    instance=random_card,
+                    context={'request': request}
+                )
+                return Response(
+                    data=serializer.data,
+                    status=status.HTTP_200_OK
+                )
+            # The card is gone, the cached ids are stale
+            invalidate_card_ids(
+                [deck_id] if deck_id else [], has_image=has_image
+            )
+        return Response(status=status.HTTP_404_NOT_FOUND)
 
-        random_card = random.choice(cards)
-        serializer = CardSerializer(
-            instance=random_card,
-            context={'request': request}
-        )
-        return Response(
-            data=serializer.data,
-            status=status.HTTP_200_OK
-        )
+    def _get_deck_id(self):
+        deck_id = self.request.query_params.get('deck')
+        if deck_id is None:
+            return None
+        try:
+            return int(deck_id)
+        except ValueError:
+            raise ValidationError({'deck': 'A valid integer is required.'})
 
 
 class AddDeckToLearningView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        deck = get_object_or_404(Deck, id=kwargs.get('deck_id'))
+        deck = identity_map.get_object_or_404(Deck, kwargs.get('deck_id'))
         deck.add_to_user(self.request.user)
 
         return Response(status=status.HTTP_201_CREATED)
@@ -0,0 +1,66 @@
+"""
+Request scoped identity map. Rows loaded during a request are kept by
+model and primary key, so views, serializers and models sharing them
+load each row at most once. It is active only while
+IdentityMapMiddleware handles a request, elsewhere every lookup goes
+to the database.
+"""
+from contextvars import ContextVar
+
+from django.core.exceptions import ValidationError
+from django.http import Http404
+
+_current = ContextVar('identity_map', default=None)
+
+
+class IdentityMap:
+    def __init__(self):
+        self.rows = {}
+
+    def _key(self, model, pk):
+        model = model._meta.concrete_model
+        return model, model._meta.pk.to_python(pk)
+
+    def add(self, instance):
+        if instance is not None and instance.pk is not None:
+            key = self._key(type(instance), instance.pk)
+            self.rows.setdefault(key, instance)
+        return instance
+
+    def get(self, model, pk):
+        key = self._key(model, pk)
+        if key not in self.rows:
+            self.rows[key] = model._default_manager.get(pk=pk)
+        return self.rows[key]
+
+
+def current():
+    """
+    Identity map of the current request, an empty one outside requests
+    """
+    return _current.get() or IdentityMap()
+
+
+def add(*instances):
+    identity_map = current()
+    for instance in instances:
+        identity_map.add(instance)
+
+
+def get(model, pk):
+    return current().get(model, pk)
+
+
+def get_object_or_404(model, pk):
+    try:
+        return get(model, pk)
+    except (model.DoesNotExist, ValidationError):
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+
+
+def activate():
+    return _current.set(IdentityMap())
+
+
+def deactivate(token):
+    _current.reset(token)
@@ -3,6 +3,8 @@ import time as pytime
 
 from django.db import connection, reset_queries
 
+from core import identity_map
+
 
 class SQLMiddleware:
     def __init__(self, get_response):
@@ -28,3 +30,18 @@ class SQLMiddleware:
             logging.info(f'Time: {query_time} | Query: {sql}')
 
         return response
+
+
+class IdentityMapMiddleware:
+    """
+    Share loaded rows for the duration of a request, see core.identity_map
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = identity_map.activate()
+        try:
+            return self.get_response(request)
+        finally:
+            identity_map.deactivate(token)
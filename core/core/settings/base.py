@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -56,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.IdentityMapMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -97,6 +100,26 @@ if all([DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT]):
     }
 
 
+# The counters, answer pools and card ids cached by cards are written
+# by the celery workers and beat and read by the web processes, so the
+# cache is shared. A process local cache is used when CACHE_URL is empty
+CACHE_URL = os.getenv('CACHE_URL', 'redis://redis:6379/1')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -163,6 +186,18 @@ CORS_ALLOWED_ORIGINS = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
+# Reference counts of the media files, kept out of the served MEDIA_ROOT
+MEDIA_REFS_ROOT = os.path.join(BASE_DIR, 'media_refs/')
+
+STORAGES = {
+    # Identical files are stored once, see core.storage
+    'default': {
+        'BACKEND': 'core.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
 DJANGO_SETTINGS_MODULE = os.getenv('DJANGO_SETTINGS_MODULE', 'core.settings.prod')
 
@@ -170,3 +205,33 @@ PIXABAY_API_KEY = os.getenv('PIXABAY_API_KEY')
 
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'roll-over-learn-today': {
+        'task': 'cards.tasks.roll_over_learn_today',
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'reconcile-due-queues': {
+        'task': 'cards.tasks.reconcile_due_queues',
+        'schedule': crontab(minute=45),
+    },
+    'archive-learning-log': {
+        'task': 'cards.tasks.archive_learning_log_task',
+        'schedule': crontab(hour=3, minute=30),
+    },
+}
+
+# Scheduling algorithm of cards.scheduling.SCHEDULERS. After changing it
+# run the reschedule command to convert the stored progress
+CARDS_SCHEDULER = os.getenv('CARDS_SCHEDULER', 'sm2')
+
+# Redis of the due queues, see cards.queues. Disabled when empty
+CARDS_DUE_QUEUE_URL = os.getenv('CARDS_DUE_QUEUE_URL')
+
+# Learning logs older than this are archived and deleted, see cards.retention
+LEARNING_LOG_RETENTION_DAYS = int(
+    os.getenv('LEARNING_LOG_RETENTION_DAYS', 365)
+)
+LEARNING_LOG_ARCHIVE_DIR = os.getenv(
+    'LEARNING_LOG_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive/')
+)
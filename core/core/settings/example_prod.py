@@ -11,3 +11,5 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 CORS_ALLOWED_ORIGINS = ["https://blenemy.github.io", "http://localhost:3000"]
 USE_X_FORWARDED_HOST = True
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+CARDS_DUE_QUEUE_URL = 'redis://redis:6379/2'
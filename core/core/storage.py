@@ -0,0 +1,131 @@
+"""
+File system storage keeping one file per content. Files are named by
+the SHA-256 of their bytes inside the upload directory of the field, so
+the media URL layout stays the same, and identical uploads share the
+file. A sidecar under MEDIA_REFS_ROOT, outside the served MEDIA_ROOT,
+counts the references of every file. The file and its sidecar are
+removed when the last reference is deleted.
+"""
+import fcntl
+import hashlib
+import os
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.functional import cached_property
+
+REFS_SUFFIX = '.refs'
+
+
+def _digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def release_on_commit(storage, name):
+    """
+    Drop one reference to name once the transaction commits
+    """
+    transaction.on_commit(partial(storage.delete, name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, refs_location=None, **kwargs):
+        super().__init__(**kwargs)
+        self._refs_location = refs_location
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'MEDIA_REFS_ROOT':
+            self.__dict__.pop('refs_location', None)
+
+    @cached_property
+    def refs_location(self):
+        return os.path.abspath(
+            self._value_or_setting(
+                self._refs_location, settings.MEDIA_REFS_ROOT
+            )
+        )
+
+    def _refs_path(self, name):
+        relative = os.path.relpath(self.path(name), self.location)
+        return os.path.join(self.refs_location, relative + REFS_SUFFIX)
+
+    def _lock_refs(self, refs_path):
+        """
+        Open the sidecar locked. A sidecar removed while this process
+        waited for its lock is opened again, so no count is lost.
+        """
+        os.makedirs(os.path.dirname(refs_path), exist_ok=True)
+        while True:
+            refs_file = os.fdopen(
+                os.open(refs_path, os.O_RDWR | os.O_CREAT, 0o644), 'r+'
+            )
+            fcntl.flock(refs_file, fcntl.LOCK_EX)
+            try:
+                if os.stat(refs_path).st_ino == os.fstat(
+                    refs_file.fileno()
+                ).st_ino:
+                    return refs_file
+            except FileNotFoundError:
+                pass
+            refs_file.close()
+
+    def _update_refs(self, name, change, create=None, remove=None):
+        """
+        Change the reference count of name under a lock on its sidecar.
+        create writes the file when it is not stored yet, remove deletes
+        it when nothing references it any more.
+        """
+        refs_path = self._refs_path(name)
+        with self._lock_refs(refs_path) as refs_file:
+            count = int(refs_file.read() or 0)
+            if self.exists(name):
+                # Files stored before the sidecar have one reference
+                count = max(count, 1)
+            else:
+                count = 0
+                if create:
+                    create()
+            count = max(count + change, 0)
+            if count == 0:
+                if remove:
+                    remove()
+                # Removed under the lock, waiting processes open it again
+                os.remove(refs_path)
+                return count
+            refs_file.seek(0)
+            refs_file.truncate()
+            refs_file.write(str(count))
+            return count
+
+    def _save(self, name, content):
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        name = os.path.join(directory, _digest(content) + extension)
+        self._update_refs(
+            name, 1, create=partial(super()._save, name, content)
+        )
+        return name
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        if not os.path.exists(self._refs_path(name)):
+            return super().delete(name)
+        self._update_refs(name, -1, remove=partial(super().delete, name))
+
+    def references(self, name):
+        """
+        How many saved files share name
+        """
+        try:
+            with open(self._refs_path(name)) as refs_file:
+                return int(refs_file.read() or 0)
+        except FileNotFoundError:
+            return 1 if self.exists(name) else 0
@@ -27,5 +27,5 @@ def save_image_from_url(model_instance, field_name, url):
 
         # Now we'll save the image content to the model's ImageField
         field = getattr(model_instance, field_name)
-        field.save(file_name, ContentFile(response.content))
+        field.save(file_name, ContentFile(response.content), save=False)
         model_instance.save()
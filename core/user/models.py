@@ -3,8 +3,10 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.utils.translation import gettext_lazy as _
 
+from cards.mixins import DirtyFieldsMixin
 
-class User(AbstractUser):
+
+class User(DirtyFieldsMixin, AbstractUser):
     username_validator = UnicodeUsernameValidator()
 
     username = models.CharField(
@@ -22,3 +24,5 @@ class User(AbstractUser):
         null=True
     )
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+
+    tracked_fields = ('avatar',)
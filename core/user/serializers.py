@@ -1,13 +1,8 @@
-from datetime import timedelta
-
 from django.contrib.auth import get_user_model
-from django.db.models import Count
-from django.db.models.functions import TruncDate
-from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 
-from cards.models import LearningLog
+from cards.models import LearningDay
 from core.fields import Base64ImageField
 
 User = get_user_model()
@@ -33,6 +28,8 @@ class UserSerializer(serializers.ModelSerializer):
     user_token = None
     avatar = Base64ImageField()
     progress = serializers.SerializerMethodField(read_only=True)
+    # Three weeks and today
+    PROGRESS_DAYS = 22
 
     class Meta:
         model = User
@@ -45,26 +42,12 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def get_progress(self, user):
-        end_date = timezone.now()
-        start_date = end_date - timedelta(weeks=3)
-        dates_list = [
-            (end_date - timedelta(days=x)).strftime('%Y-%m-%d')
-            for x in range(0, (end_date - start_date).days + 1)
-        ]
-
-        log_data = (
-            LearningLog.objects.filter(user=user)
-            .annotate(date=TruncDate('created_at'))
-            .values('date')
-            .annotate(count=Count('id'))
-            .order_by('date')
-        )
-
-        progress = {str(data['date']): data['count'] for data in log_data}
-        for date in dates_list:
-            progress.setdefault(date, 0)
-
-        return progress
+        return {
+            day.strftime('%Y-%m-%d'): count
+            for day, count in LearningDay.objects.window(
+                user, self.PROGRESS_DAYS
+            ).items()
+        }
 
     def update(self, instance, validated_data):
         password = validated_data.get('password')
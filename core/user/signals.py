@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.storage import release_on_commit
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def release_replaced_avatar(sender, instance, **kwargs):
+    previous = instance.loaded_value('avatar')
+    if previous and 'avatar' in instance.changed_fields():
+        release_on_commit(instance.avatar.storage, previous)
+
+
+@receiver(post_delete, sender=User)
+def release_avatar(sender, instance, **kwargs):
+    # Avatars are shared by content like card images, see core.storage
+    if instance.avatar:
+        release_on_commit(instance.avatar.storage, instance.avatar.name)
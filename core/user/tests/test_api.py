@@ -1,11 +1,14 @@
 import json
+from datetime import timedelta
 
 from django.urls import reverse
 from django.contrib.auth import authenticate
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 
+from cards.models import LearningDay
 from user.models import User
 
 
@@ -353,3 +356,27 @@ class UserProfileTests(APITestCase):
         self.assertNotEqual(self.token.key, new_token)
         self.assertTrue(user)
         self.assertIsNone(response.data.get('password'))
+
+    def test_get_user_profile_progress(self):
+        """
+        Test GET user profile returns learning counts of the last 22 days
+        """
+        today = timezone.now().date()
+        LearningDay.objects.create(user=self.user, date=today, count=3)
+        LearningDay.objects.create(
+            user=self.user, date=today - timedelta(days=21), count=2
+        )
+        LearningDay.objects.create(
+            user=self.user, date=today - timedelta(days=22), count=7
+        )
+        self.client.force_authenticate(self.user)
+        url = reverse('user:user_profile')
+        response = self.client.get(url)
+        progress = response.data['progress']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(progress), 22)
+        self.assertEqual(progress[str(today)], 3)
+        self.assertEqual(progress[str(today - timedelta(days=21))], 2)
+        self.assertEqual(progress[str(today - timedelta(days=1))], 0)
+        self.assertNotIn(str(today - timedelta(days=22)), progress)